@@ -3,17 +3,22 @@ import os
 from datetime import datetime, timedelta
 from random import randbytes, randint
 # from typing import Annotated
-from fastapi import APIRouter, HTTPException, status, Body, Response, Depends
+from fastapi import APIRouter, HTTPException, status, Body, Request, Response, Depends
 from fastapi_jwt_auth import AuthJWT
+from pymongo.errors import DuplicateKeyError
 from config import settings
 from database.mongo import get_collection
 from emailsetup.verifyEmail import ForgotPassEmail
+from services.otp import (
+    OTP_PASSWORD_RESET, OTP_PURPOSES, OTP_INVALID, OTP_LOCKED, OTP_MISSING,
+    issue_otp, check_otp, discard_otp, discard_otps,
+)
 from schemas import UserSignupSchema, UserSigninSchema, ForgotPasswordSchema, ResetPasswordSchema, \
     UpdatePasswordSchema, VerifyOTPSchema, GoogleLoginSchema
-from utils import hash_password, verify_password
+from utils import hash_password_async, verify_password_async
 from jwt_config import get_jwt_config
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from services.google_auth import get_google_verifier
+from services.rate_limit import enforce_rate_limit
 from fastapi import Depends
 from schemas import GoogleLoginSchema
 import traceback
@@ -29,12 +34,8 @@ REFRESH_TOKEN_EXPIRES_IN = int(os.getenv("REFRESH_TOKEN_EXPIRES_IN", 1440))  # d
 @router.post("/auth/google")
 async def google_login(payload: GoogleLoginSchema, Authorize: AuthJWT = Depends()):
     try:
-        # Verify Google ID token
-        idinfo = id_token.verify_oauth2_token(
-            payload.token,
-            google_requests.Request(),
-            os.getenv("GOOGLE_CLIENT_ID")
-        )
+        # Verify Google ID token (signing certs are cached, decoding runs off the event loop)
+        idinfo = await get_google_verifier().verify(payload.token)
 
         email = idinfo.get("email")
         name = idinfo.get("name")
@@ -96,7 +97,8 @@ async def google_login(payload: GoogleLoginSchema, Authorize: AuthJWT = Depends(
 
 
 @router.post("/signup")
-async def signup_user(payload: UserSignupSchema):
+async def signup_user(payload: UserSignupSchema, request: Request):
+    await enforce_rate_limit(request, "signup", payload.email)
     # 1. Check if user already exists using Gmail
     existing_user = await Users.find_one({"email": payload.email})
     if existing_user:
@@ -122,15 +124,24 @@ async def signup_user(payload: UserSignupSchema):
         "status": "active",
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
-        "password": hash_password(payload.password)
+        "password": await hash_password_async(payload.password)
     })
 
-    result = await Users.insert_one(user_info)
+    try:
+        result = await Users.insert_one(user_info)
+    except DuplicateKeyError:
+        # A concurrent signup with the same email won the unique index
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email is already registered"
+        )
     return {"status": "success", "user_id": str(result.inserted_id)}
 
 
 @router.post("/signin")
-async def users_signin(payload: UserSigninSchema, response: Response, Authorize: AuthJWT = Depends()):
+async def users_signin(payload: UserSigninSchema, request: Request, response: Response,
+                       Authorize: AuthJWT = Depends()):
+    await enforce_rate_limit(request, "signin", payload.email)
     # Check if the user exists
     db_user = await Users.find_one({"email": payload.email})
     print("db user", db_user)
@@ -140,7 +151,7 @@ async def users_signin(payload: UserSigninSchema, response: Response, Authorize:
             detail="Incorrect Email",
         )
     if db_user:
-        if not verify_password(payload.password, db_user["password"]):
+        if not await verify_password_async(payload.password, db_user["password"]):
             if not payload.password:
                 raise HTTPException(detail="User not found")
             raise HTTPException(
@@ -176,36 +187,43 @@ async def users_signin(payload: UserSigninSchema, response: Response, Authorize:
 
 
 @router.post("/verify")
-async def verify_otp(payload: VerifyOTPSchema):
-    db_user = await Users.find_one({"email": payload.email})
+async def verify_otp(payload: VerifyOTPSchema, request: Request):
+    await enforce_rate_limit(request, "verify_otp", payload.email)
+    purpose = payload.purpose or OTP_PASSWORD_RESET
+    if purpose not in OTP_PURPOSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown OTP purpose."
+        )
+
+    db_user = await Users.find_one({"email": payload.email}, {"_id": 1})
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found."
         )
 
-    if "verification_code" not in db_user or db_user["verification_code"] is None:
+    result = await check_otp(payload.email, purpose, payload.otp)
+    if result == OTP_MISSING:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No OTP found. Please request a new one."
         )
-
-    if db_user["verification_code"] != payload.otp:
+    if result == OTP_LOCKED:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts. Please request a new OTP."
+        )
+    if result == OTP_INVALID:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid OTP."
         )
 
-    # Clear the verification_code and optionally mark the user as verified
-    await Users.find_one_and_update(
-        {"email": payload.email},
-        {
-            "$set": {
-                "verified": True,
-                "verification_code": None,
-                "updated_at": datetime.utcnow()
-            }
-        },
+    # The code is consumed by check_otp; only touch the user document if the flag changes
+    await Users.update_one(
+        {"_id": db_user["_id"], "verified": {"$ne": True}},
+        {"$set": {"verified": True, "updated_at": datetime.utcnow()}},
     )
 
     return {
@@ -215,38 +233,29 @@ async def verify_otp(payload: VerifyOTPSchema):
 
 
 @router.post("/forgotPass")
-async def forgot_pass(payload: ForgotPasswordSchema):
+async def forgot_pass(payload: ForgotPasswordSchema, request: Request):
+    await enforce_rate_limit(request, "forgot_pass", payload.email)
     if payload.email == "":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Email"
         )
-    existing = await Users.find_one({"email": payload.email})
-    print(existing)
+    existing = await Users.find_one({"email": payload.email}, {"name": 1})
     if existing:
+        verification_code = await issue_otp(payload.email, OTP_PASSWORD_RESET)
+        # Delivered by the email outbox worker, so SMTP latency never reaches this request
         try:
-
-            verification_code = str(randint(100000, 999999))
-            await Users.find_one_and_update(
-                {"email": payload.email},
-                {
-                    "$set": {
-                        "verification_code": verification_code,
-                        "updated_at": datetime.utcnow(),
-                    }
-                },
-            )
             await ForgotPassEmail(
                 existing["name"], verification_code, [payload.email]
-            ).sendVerificationCode()
+            ).queueVerificationCode(
+                expires_at=datetime.utcnow() + timedelta(seconds=settings.OTP_TTL_SECONDS)
+            )
         except Exception as error:
             print(error)
-            await Users.find_one_and_update(
-                {"email": payload.email},
-                {"$set": {"verification_code": None, "updated_at": datetime.utcnow()}},
-            )
+            # Nobody will receive this code, so don't leave it valid
+            await discard_otp(payload.email, OTP_PASSWORD_RESET, verification_code)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="There was an error sending email setup",
+                detail="There was an error sending the reset code",
             )
     return {
         "status": "success",
@@ -276,7 +285,7 @@ async def reset_pass(payload: ResetPasswordSchema, Authorize: AuthJWT = Depends(
             detail="Please verify your email before resetting password"
         )
 
-    hashed_password = hash_password(payload.password)
+    hashed_password = await hash_password_async(payload.password)
 
     try:
         await Users.find_one_and_update(
@@ -285,10 +294,10 @@ async def reset_pass(payload: ResetPasswordSchema, Authorize: AuthJWT = Depends(
                 "$set": {
                     "password": hashed_password,
                     "updated_at": datetime.utcnow(),
-                    "verification_code": None  # clear old OTP if any
                 }
             }
         )
+        await discard_otps(user["email"])
     except Exception as error:
         print(error)
         raise HTTPException(
@@ -334,19 +343,17 @@ async def update_pass(payload: UpdatePasswordSchema):
         )
     existing = await Users.find_one({"email": payload.email})
     if existing:
-        user_info = payload.dict()
-
-        if not verify_password(payload.oldPassword, existing["password"]):
+        if not await verify_password_async(payload.oldPassword, existing["password"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid old password"
             )
-        user_info["password"] = hash_password(payload.password)
+        hashed_password = await hash_password_async(payload.password)
         try:
             await Users.find_one_and_update(
                 {"email": payload.email},
                 {
                     "$set": {
-                        "password": hash_password(payload.password),
+                        "password": hashed_password,
                         "updated_at": datetime.utcnow(),
                     }
                 },
@@ -0,0 +1,100 @@
+import base64
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query
+from database.mongo import get_collection
+from services.posts import get_raw_responses, get_raw_record
+
+router = APIRouter()
+social_collection = get_collection("social")
+
+# Posts written before the compact schema still embed the raw blobs until
+# `python -m database.migrate_posts` has moved them to the archive
+LEGACY_RAW_FIELDS = {"cloudinary_response": 0, "instagram_response": 0, "facebook_response": 0}
+
+
+def encode_cursor(post: dict) -> str:
+    raw = f"{post['uploaded_at'].isoformat()}|{post['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        uploaded_at, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(uploaded_at), ObjectId(post_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/posts/{user_id}")
+async def get_post_history(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_raw: bool = False
+):
+    """
+    Newest-first post history, paged with a keyset cursor on (uploaded_at, _id).
+
+    Each page is a single range scan on the (user_id, uploaded_at, _id) index,
+    so page 1000 costs the same as page 1.
+    """
+    try:
+        user_obj_id = ObjectId(user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user_id format")
+
+    query = {"user_id": user_obj_id}
+    if start or end:
+        query["uploaded_at"] = {}
+        if start:
+            query["uploaded_at"]["$gte"] = start
+        if end:
+            query["uploaded_at"]["$lt"] = end
+    if cursor:
+        cursor_uploaded_at, cursor_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"uploaded_at": {"$lt": cursor_uploaded_at}},
+            {"uploaded_at": cursor_uploaded_at, "_id": {"$lt": cursor_id}},
+        ]
+
+    posts = await social_collection.find(query, LEGACY_RAW_FIELDS) \
+        .sort([("uploaded_at", -1), ("_id", -1)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    next_cursor = encode_cursor(posts[-1]) if has_more else None
+
+    raw_responses = await get_raw_responses([post["_id"] for post in posts]) if include_raw else {}
+    for post in posts:
+        if include_raw:
+            post["raw"] = raw_responses.get(post["_id"])
+        post["_id"] = str(post["_id"])
+        post["user_id"] = str(post["user_id"])
+
+    return {
+        "data": posts,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    }
+
+
+@router.get("/posts/{user_id}/{post_id}/raw")
+async def get_post_raw_responses(user_id: str, post_id: str):
+    """The archived Cloudinary and Graph API responses for one post."""
+    try:
+        user_obj_id = ObjectId(user_id)
+        post_obj_id = ObjectId(post_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user_id or post_id format")
+
+    raw = await get_raw_record(post_obj_id, user_obj_id)
+    if not raw:
+        raise HTTPException(status_code=404, detail="Raw responses not found for this post")
+
+    return {"post_id": post_id, **raw}
@@ -1,65 +1,76 @@
 #api\social_media.py
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException
+from pymongo.errors import DuplicateKeyError
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Form, File, UploadFile, Header
 from datetime import datetime
 from io import BytesIO
 import base64
-import cloudinary
-import cloudinary.uploader
-import requests
 import os
 from database.mongo import get_collection
+from services.media_storage import (
+    upload_media,
+    store_media,
+    content_hash,
+    create_upload_signature,
+    verify_direct_upload,
+    build_media_url,
+    DELIVERY_FORMATS,
+)
+from services.graph_client import graph_post
+from services.publisher import get_platform_credentials, publish_image
+from services.video_jobs import enqueue_video_job, get_video_job
+from services.posts import record_post
+from services.graph_quota import get_quota_states
+from services.metrics import track_stage
+from services.resilience import get_breaker_states
+from services.idempotency import run_idempotent, request_fingerprint
+from services.scheduler import (
+    schedule_post, get_scheduled_post, cancel_scheduled_post, CANCEL_IN_PROGRESS, CANCEL_NOT_FOUND
+)
+from services.tenant_cache import get_cached_tenant, get_cached_tenants, invalidate_tenant, get_tenant_cache_stats
 from schemas import SocialMediaRequest, TenantData, InstaCredentials, FacebookCredentials
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from schemas import SocialMediaRequest, TenantData, InstaCredentials, FacebookCredentials,SocialMediaVideoRequest
+from schemas import UploadSignatureRequest, PublishMediaRequest, ScheduledPostRequest, BulkSocialMediaRequest
 import asyncio
-import io
-
-# Environment Variables
-cloudinary.config(
-    cloud_name=os.getenv("ACLOUD_NAME"),
-    api_key=os.getenv("API_KEYS"),
-    api_secret=os.getenv("API_SECRET")
-)
+from config import settings
 
 # Router instance
 router = APIRouter()
-social_collection = get_collection("social")
 tenant_collection = get_collection("tenant")
 
 
+async def _upsert_tenant(user_id: str, fields: dict):
+    """Set fields on the user's tenant document, creating it if needed, in one round trip."""
+    query = {"user_id": ObjectId(user_id)}
+    update = {"$set": fields, "$setOnInsert": {"created_at": datetime.utcnow()}}
+    try:
+        return await tenant_collection.update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent save created the document first; the retry updates it
+        return await tenant_collection.update_one(query, update, upsert=True)
+
+
 @router.post("/save-instagram-credentials/")
 async def save_instagram_credentials(data: InstaCredentials):
     try:
-        # Check if document exists for this user
-        existing = await tenant_collection.find_one({"user_id": ObjectId(data.user_id)})
-        if existing:
-            # Update only Instagram credentials
-            await tenant_collection.update_one(
-                {"user_id": ObjectId(data.user_id)},
-                {"$set": {
-                    "insta_credentials": {
-                        "ACCESS_TOKENS": data.ACCESS_TOKENS,
-                        "IG_USER_ID": data.IG_USER_ID
-                    }
-                }}
-            )
-            return {"message": "Instagram credentials updated successfully"}
-        else:
-            # Create new document with Instagram credentials
-            document = {
-                "user_id": ObjectId(data.user_id),
-                "insta_credentials": {
-                    "ACCESS_TOKENS": data.ACCESS_TOKENS,
-                    "IG_USER_ID": data.IG_USER_ID
-                },
-                "created_at": datetime.utcnow()
+        # Update Instagram credentials, or create the document if this is a new user
+        result = await _upsert_tenant(data.user_id, {
+            "insta_credentials": {
+                "ACCESS_TOKENS": data.ACCESS_TOKENS,
+                "IG_USER_ID": data.IG_USER_ID
             }
-            result = await tenant_collection.insert_one(document)
-            return {"message": "Instagram credentials saved", "id": str(result.inserted_id)}
+        })
+        invalidate_tenant(data.user_id)
+
+        if result.upserted_id is None:
+            return {"message": "Instagram credentials updated successfully"}
+        return {"message": "Instagram credentials saved", "id": str(result.upserted_id)}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
     
 # @router.post("/save-instagram-credentials/")
 # async def save_instagram_credentials(data: InstaCredentials):
@@ -117,7 +128,7 @@ async def save_instagram_credentials(data: InstaCredentials):
 async def get_instagram_credentials(user_id: str):
     try:
         # Look for the document with the given user_id
-        existing = await tenant_collection.find_one({"user_id": ObjectId(user_id)})
+        existing = await get_cached_tenant(ObjectId(user_id))
 
         if not existing:
             raise HTTPException(status_code=404, detail="User not found")
@@ -139,32 +150,18 @@ async def get_instagram_credentials(user_id: str):
 @router.post("/save-facebook-credentials/")
 async def save_facebook_credentials(data: FacebookCredentials):
     try:
-        # Check if document exists for this user
-        existing = await tenant_collection.find_one({"user_id": ObjectId(data.user_id)})
-        if existing:
-            # Update only Facebook credentials
-            await tenant_collection.update_one(
-                {"user_id": ObjectId(data.user_id)},
-                {"$set": {
-                    "facebook_credentials": {
-                        "PAGE_ID": data.PAGE_ID,
-                        "FACEBOOK_ACCESS": data.FACEBOOK_ACCESS
-                    }
-                }}
-            )
-            return {"message": "Facebook credentials updated successfully"}
-        else:
-            # Create new document with Facebook credentials
-            document = {
-                "user_id": ObjectId(data.user_id),
-                "facebook_credentials": {
-                    "PAGE_ID": data.PAGE_ID,
-                    "FACEBOOK_ACCESS": data.FACEBOOK_ACCESS
-                },
-                "created_at": datetime.utcnow()
+        # Update Facebook credentials, or create the document if this is a new user
+        result = await _upsert_tenant(data.user_id, {
+            "facebook_credentials": {
+                "PAGE_ID": data.PAGE_ID,
+                "FACEBOOK_ACCESS": data.FACEBOOK_ACCESS
             }
-            result = await tenant_collection.insert_one(document)
-            return {"message": "Facebook credentials saved", "id": str(result.inserted_id)}
+        })
+        invalidate_tenant(data.user_id)
+
+        if result.upserted_id is None:
+            return {"message": "Facebook credentials updated successfully"}
+        return {"message": "Facebook credentials saved", "id": str(result.upserted_id)}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -174,7 +171,7 @@ async def save_facebook_credentials(data: FacebookCredentials):
 async def get_facebook_credentials(user_id: str):
     try:
         # Search for the document with the given user_id
-        existing = await tenant_collection.find_one({"user_id": ObjectId(user_id)})
+        existing = await get_cached_tenant(ObjectId(user_id))
 
         if not existing:
             raise HTTPException(status_code=404, detail="User not found")
@@ -196,10 +193,6 @@ async def get_facebook_credentials(user_id: str):
 @router.put("/edit-instagram-credentials/")
 async def edit_instagram_credentials(data: InstaCredentials):
     try:
-        existing = await tenant_collection.find_one({"user_id": ObjectId(data.user_id)})
-        if not existing:
-            raise HTTPException(status_code=404, detail="User credentials not found")
-
         update_result = await tenant_collection.update_one(
             {"user_id": ObjectId(data.user_id)},
             {"$set": {
@@ -207,6 +200,9 @@ async def edit_instagram_credentials(data: InstaCredentials):
                 "insta_credentials.IG_USER_ID": data.IG_USER_ID
             }}
         )
+        if update_result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="User credentials not found")
+        invalidate_tenant(data.user_id)
 
         if update_result.modified_count == 0:
             return {"message": "No changes made"}
@@ -219,10 +215,6 @@ async def edit_instagram_credentials(data: InstaCredentials):
 @router.put("/edit-facebook-credentials/")
 async def edit_facebook_credentials(data: FacebookCredentials):
     try:
-        existing = await tenant_collection.find_one({"user_id": ObjectId(data.user_id)})
-        if not existing:
-            raise HTTPException(status_code=404, detail="User credentials not found")
-
         update_result = await tenant_collection.update_one(
             {"user_id": ObjectId(data.user_id)},
             {"$set": {
@@ -230,6 +222,9 @@ async def edit_facebook_credentials(data: FacebookCredentials):
                 "facebook_credentials.FACEBOOK_ACCESS": data.FACEBOOK_ACCESS
             }}
         )
+        if update_result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="User credentials not found")
+        invalidate_tenant(data.user_id)
 
         if update_result.modified_count == 0:
             return {"message": "No changes made"}
@@ -242,11 +237,6 @@ async def edit_facebook_credentials(data: FacebookCredentials):
 @router.post("/save-credentials/")
 async def save_credentials(data: TenantData):
     try:
-        # Check if credentials already exist for the user
-        existing = await tenant_collection.find_one({"user_id": ObjectId(data.user_id)})
-        if existing:
-            raise HTTPException(status_code=409, detail="Credentials already exist for this user")
-
         document = {
             "user_id": ObjectId(data.user_id),
             "insta_credentials": {
@@ -260,7 +250,12 @@ async def save_credentials(data: TenantData):
             "created_at": datetime.utcnow()
         }
 
-        result = await tenant_collection.insert_one(document)
+        # The unique index on user_id rejects a second document for the same user
+        try:
+            result = await tenant_collection.insert_one(document)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=409, detail="Credentials already exist for this user")
+        invalidate_tenant(data.user_id)
         return {"message": "Credentials saved successfully", "id": str(result.inserted_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -270,7 +265,7 @@ async def save_credentials(data: TenantData):
 async def get_credentials(user_id: str):
     try:
         # Search for the document with this user_id
-        existing = await tenant_collection.find_one({"user_id": ObjectId(user_id)})
+        existing = await get_cached_tenant(ObjectId(user_id))
 
         if not existing:
             raise HTTPException(status_code=404, detail="User not found")
@@ -314,6 +309,7 @@ async def update_credentials(data: TenantData):
             {"user_id": user_obj_id},
             {"$set": update_fields}
         )
+        invalidate_tenant(user_obj_id)
 
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Credentials not found for the given user")
@@ -333,7 +329,7 @@ async def upload_image(payload: SocialMediaRequest):
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid user_id format")
 
-        tenant = await tenant_collection.find_one({"user_id": user_obj_id})
+        tenant = await get_cached_tenant(user_obj_id)
         if not tenant:
             raise HTTPException(status_code=404, detail="Credentials for this user not found")
 
@@ -350,14 +346,15 @@ async def upload_image(payload: SocialMediaRequest):
 
         # Step 2: Decode base64 image
         try:
-            image_data = base64.b64decode(payload.base64_image)
+            with track_stage("decode"):
+                image_data = base64.b64decode(payload.base64_image)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid base64 image data")
 
         image_file = BytesIO(image_data)
 
         # Step 3: Upload to Cloudinary
-        result = cloudinary.uploader.upload(image_file)
+        result = await upload_media(image_file)
         result["uploaded_at"] = datetime.utcnow()
 
         image_url = result.get("secure_url")
@@ -365,49 +362,42 @@ async def upload_image(payload: SocialMediaRequest):
             raise HTTPException(status_code=500, detail="Image URL not returned from Cloudinary")
 
         # Step 4: Post to Instagram
-        container_url = f"https://graph.facebook.com/v23.0/{IG_USER_ID}/media"
+        container_url = f"{IG_USER_ID}/media"
         container_payload = {
             "image_url": image_url,
             "caption": payload.caption,
             "access_token": ACCESS_TOKENS
         }
-        container_res = requests.post(container_url, data=container_payload).json()
+        container_res = await graph_post(container_url, data=container_payload, platform="instagram", account=IG_USER_ID)
 
         if 'id' not in container_res:
             raise HTTPException(status_code=400, detail=f"Instagram media creation failed: {container_res}")
 
-        publish_url = f"https://graph.facebook.com/v23.0/{IG_USER_ID}/media_publish"
+        publish_url = f"{IG_USER_ID}/media_publish"
         publish_payload = {
             "creation_id": container_res['id'],
             "access_token": ACCESS_TOKENS
         }
-        insta_response = requests.post(publish_url, data=publish_payload).json()
+        insta_response = await graph_post(publish_url, data=publish_payload, platform="instagram", account=IG_USER_ID, publish=True)
 
         # Step 5: Post to Facebook
-        fb_url = f"https://graph.facebook.com/v23.0/{PAGE_ID}/photos"
+        fb_url = f"{PAGE_ID}/photos"
         fb_payload = {
             "url": image_url,
             "caption": payload.caption,
             "access_token": FACEBOOK_ACCESS
         }
-        fb_response = requests.post(fb_url, data=fb_payload).json()
+        fb_response = await graph_post(fb_url, data=fb_payload, platform="facebook", account=PAGE_ID, publish=True)
 
         # Step 6: Save to MongoDB
+        post = await record_post(user_obj_id, payload.caption, result, insta_response, fb_response)
         full_record = {
-            "user_id": user_obj_id,
-            "caption": payload.caption,
-            "uploaded_at": datetime.utcnow(),
+            **post,
             "cloudinary_response": result,
             "instagram_response": insta_response,
             "facebook_response": fb_response
         }
 
-        insert_result = await social_collection.insert_one(full_record)
-
-        # Convert ObjectId to string for return
-        full_record["_id"] = str(insert_result.inserted_id)
-        full_record["user_id"] = str(full_record["user_id"])
-
         return {
             "message": "Upload and posting successful",
             "data": full_record
@@ -417,8 +407,43 @@ async def upload_image(payload: SocialMediaRequest):
         raise HTTPException(status_code=500, detail=f"Operation failed: {str(e)}")
 
 
+async def _publish_and_record_image(user_obj_id: ObjectId, creds: dict, caption: str, result: dict):
+    # Post to Instagram and Facebook concurrently (each only if creds exist)
+    insta_response, fb_response = await publish_image(creds, result["secure_url"], caption)
+
+    # Only the compact post is stored in "social"; the raw responses are archived
+    # but still returned to the caller
+    post = await record_post(user_obj_id, caption, result, insta_response, fb_response)
+    return {
+        **post,
+        "cloudinary_response": result,
+        "instagram_response": insta_response,
+        "facebook_response": fb_response
+    }
+
+
+def _decode_base64(data: str, kind: str) -> bytes:
+    try:
+        with track_stage("decode"):
+            return base64.b64decode(data)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid base64 {kind} data")
+
+
 @router.post("/upload-socialmedia/")
-async def upload_image(payload: SocialMediaRequest):
+async def upload_image(payload: SocialMediaRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    image_data = _decode_base64(payload.base64_image, "image")
+    # Only hashed for the fingerprint when a key is sent; store_media reuses the digest
+    digest = await content_hash(image_data) if idempotency_key else None
+    return await run_idempotent(
+        idempotency_key,
+        f"upload-socialmedia:{payload.user_id}",
+        lambda: request_fingerprint(payload.user_id, payload.caption, digest),
+        lambda: _upload_image(payload, image_data, digest)
+    )
+
+
+async def _upload_image(payload: SocialMediaRequest, image_data: bytes, digest: str = None):
     try:
         # Step 1: Fetch credentials from tenant collection
         try:
@@ -426,207 +451,509 @@ async def upload_image(payload: SocialMediaRequest):
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid user_id format")
 
-        tenant = await tenant_collection.find_one({"user_id": user_obj_id})
+        tenant = await get_cached_tenant(user_obj_id)
         if not tenant:
             raise HTTPException(status_code=404, detail="Credentials for this user not found")
 
-        insta_creds = tenant.get("insta_credentials", {})
-        fb_creds = tenant.get("facebook_credentials", {})
+        creds = get_platform_credentials(tenant)
 
-        IG_USER_ID = insta_creds.get("IG_USER_ID")
-        ACCESS_TOKENS = insta_creds.get("ACCESS_TOKENS")
-        PAGE_ID = fb_creds.get("PAGE_ID")
-        FACEBOOK_ACCESS = fb_creds.get("FACEBOOK_ACCESS")
+        # Step 2: Upload to Cloudinary (skipped when this exact image was uploaded before)
+        result = await store_media(image_data, digest=digest)
+        result["uploaded_at"] = datetime.utcnow()
+        image_url = result.get("secure_url")
+        if not image_url:
+            raise HTTPException(status_code=500, detail="Image URL not returned from Cloudinary")
 
-        # Step 2: Decode base64 image
+        # Step 3: Post to Instagram/Facebook and save to MongoDB
+        full_record = await _publish_and_record_image(user_obj_id, creds, payload.caption, result)
+
+        return {
+            "message": "Upload successful",
+            "data": full_record
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Operation failed: {str(e)}")
+
+@router.post("/bulk-upload-socialmedia/")
+async def bulk_upload_image(payload: BulkSocialMediaRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    image_data = _decode_base64(payload.base64_image, "image")
+    digest = await content_hash(image_data) if idempotency_key else None
+    return await run_idempotent(
+        idempotency_key,
+        "bulk-upload-socialmedia",
+        lambda: request_fingerprint(*payload.user_ids, payload.caption, digest),
+        lambda: _bulk_upload_image(payload, image_data, digest)
+    )
+
+
+async def _bulk_upload_image(payload: BulkSocialMediaRequest, image_data: bytes, digest: str = None):
+    """
+    Publish one image to many tenants.
+
+    The image is uploaded to Cloudinary once, all tenants' credentials are
+    loaded together, and the per-tenant Graph API publishes run with at most
+    BULK_PUBLISH_CONCURRENCY in flight. One tenant failing never affects another.
+    """
+    # Valid ids are keyed by their canonical form (str(ObjectId)), so "ABC..." and
+    # "abc..." are one tenant and match the keys of the publish results below
+    report = {}
+    user_ids = []
+    user_obj_ids = []
+    for raw_user_id in payload.user_ids:
         try:
-            image_data = base64.b64decode(payload.base64_image)
+            user_obj_id = ObjectId(raw_user_id)
         except Exception:
-            raise HTTPException(status_code=400, detail="Invalid base64 image data")
+            user_obj_id = None
+        user_id = str(user_obj_id) if user_obj_id else raw_user_id
+        if user_id in user_ids:
+            continue
+        user_ids.append(user_id)
+        if user_obj_id:
+            user_obj_ids.append(user_obj_id)
+        else:
+            report[user_id] = {"user_id": user_id, "status": "failed", "error": "Invalid user_id format"}
+
+    if not user_ids:
+        raise HTTPException(status_code=400, detail="user_ids must not be empty")
+    if len(user_ids) > settings.BULK_PUBLISH_MAX_TENANTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BULK_PUBLISH_MAX_TENANTS} user_ids per request"
+        )
 
-        image_file = BytesIO(image_data)
+    try:
+        tenants = await get_cached_tenants(user_obj_ids)
+        if not tenants:
+            raise HTTPException(status_code=404, detail="Credentials for these users not found")
 
-        # Step 3: Upload to Cloudinary
-        result = cloudinary.uploader.upload(image_file)
+        result = await store_media(image_data, digest=digest)
         result["uploaded_at"] = datetime.utcnow()
-        image_url = result.get("secure_url")
-        if not image_url:
+        if not result.get("secure_url"):
             raise HTTPException(status_code=500, detail="Image URL not returned from Cloudinary")
 
-        insta_response, fb_response = None, None
+        slots = asyncio.Semaphore(settings.BULK_PUBLISH_CONCURRENCY)
+
+        async def publish_for_tenant(user_obj_id: ObjectId):
+            user_id = str(user_obj_id)
+            tenant = tenants.get(user_id)
+            if not tenant:
+                return {"user_id": user_id, "status": "failed", "error": "Credentials for this user not found"}
+            async with slots:
+                try:
+                    insta_response, fb_response = await publish_image(
+                        get_platform_credentials(tenant), result["secure_url"], payload.caption
+                    )
+                    post = await record_post(user_obj_id, payload.caption, result, insta_response, fb_response)
+                except Exception as e:
+                    return {"user_id": user_id, "status": "failed", "error": str(e)}
+            return {
+                "user_id": user_id,
+                "status": post["status"],
+                "post_id": post["_id"],
+                "instagram_response": insta_response,
+                "facebook_response": fb_response
+            }
 
-        # Step 4: Post to Instagram if creds exist
-        if IG_USER_ID and ACCESS_TOKENS:
-            container_url = f"https://graph.facebook.com/v23.0/{IG_USER_ID}/media"
+        for entry in await asyncio.gather(*(publish_for_tenant(oid) for oid in user_obj_ids)):
+            report[entry["user_id"]] = entry
 
-            container_payload = {
-                "image_url": image_url,
-                "caption": payload.caption,
-                "access_token": ACCESS_TOKENS
-            }
-            container_res = requests.post(container_url, data=container_payload).json()
+        results = [report[user_id] for user_id in user_ids]
+        summary = {}
+        for entry in results:
+            summary[entry["status"]] = summary.get(entry["status"], 0) + 1
 
-            if 'id' not in container_res:
-                raise HTTPException(status_code=400, detail=f"Instagram media creation failed: {container_res}")
+        return {
+            "message": "Bulk upload finished",
+            "media_url": result["secure_url"],
+            "summary": summary,
+            "results": results
+        }
 
-            publish_url = f"https://graph.facebook.com/v23.0/{IG_USER_ID}/media_publish"
-            publish_payload = {
-                "creation_id": container_res['id'],
-                "access_token": ACCESS_TOKENS
-            }
-            insta_response = requests.post(publish_url, data=publish_payload).json()
-
-        # Step 5: Post to Facebook if creds exist
-        if PAGE_ID and FACEBOOK_ACCESS:
-            fb_url = f"https://graph.facebook.com/v23.0/{PAGE_ID}/photos"
-            fb_payload = {
-                "url": image_url,
-                "caption": payload.caption,
-                "access_token": FACEBOOK_ACCESS
-            }
-            fb_response = requests.post(fb_url, data=fb_payload).json()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Operation failed: {str(e)}")
 
-        # Step 6: Save to MongoDB
-        full_record = {
-            "user_id": user_obj_id,
-            "caption": payload.caption,
-            "uploaded_at": datetime.utcnow(),
-            "cloudinary_response": result,
-            "instagram_response": insta_response,
-            "facebook_response": fb_response
+
+@router.post("/upload-video-socialmedia/", status_code=202)
+async def upload_video_file(payload: SocialMediaVideoRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    video_bytes = _decode_base64(payload.base64_video, "video")
+    digest = await content_hash(video_bytes) if idempotency_key else None
+    return await run_idempotent(
+        idempotency_key,
+        f"upload-video-socialmedia:{payload.user_id}",
+        lambda: request_fingerprint(payload.user_id, payload.caption, digest),
+        lambda: _upload_video_file(payload, video_bytes, digest),
+        status_code=202
+    )
+
+
+async def _upload_video_file(payload: SocialMediaVideoRequest, video_bytes: bytes, digest: str = None):
+    try:
+        # 1. Make sure the user has credentials before uploading anything
+        try:
+            user_obj_id = ObjectId(payload.user_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid user_id format")
+
+        tenant = await get_cached_tenant(user_obj_id)
+        if not tenant:
+            raise HTTPException(status_code=404, detail="Credentials not found")
+
+        # 2. Upload video to Cloudinary (skipped when this exact video was uploaded before)
+        result = await store_media(
+            video_bytes,
+            "video",
+            digest=digest,
+            folder="social_videos"
+        )
+        if not result.get("secure_url"):
+            raise HTTPException(status_code=500, detail="Video URL not returned from Cloudinary")
+
+        # 3. Hand the Instagram/Facebook publishing over to the job worker
+        job_id = await enqueue_video_job(user_obj_id, payload.caption, result)
+
+        return {
+            "message": "Video upload accepted, publishing in background",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}"
         }
 
-        insert_result = await social_collection.insert_one(full_record)
-        full_record["_id"] = str(insert_result.inserted_id)
-        full_record["user_id"] = str(full_record["user_id"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upload-socialmedia-file/")
+async def upload_image_file(
+    user_id: str = Form(...),
+    caption: str = Form(...),
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Multipart variant of /upload-socialmedia/; the image is read from the spooled upload, not the request body."""
+    # Fingerprint the content itself; store_media reuses the digest for its dedup lookup
+    digest = await content_hash(file.file)
+    return await run_idempotent(
+        idempotency_key,
+        f"upload-socialmedia-file:{user_id}",
+        lambda: request_fingerprint(user_id, caption, digest),
+        lambda: _upload_image_file(user_id, caption, file, digest)
+    )
+
+
+async def _upload_image_file(user_id: str, caption: str, file: UploadFile, digest: str):
+    try:
+        try:
+            user_obj_id = ObjectId(user_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid user_id format")
+
+        if not (file.content_type or "").startswith("image/"):
+            raise HTTPException(status_code=400, detail="Uploaded file is not an image")
+
+        tenant = await get_cached_tenant(user_obj_id)
+        if not tenant:
+            raise HTTPException(status_code=404, detail="Credentials for this user not found")
+
+        creds = get_platform_credentials(tenant)
+
+        # The multipart parser has already spooled the body to a temp file
+        result = await store_media(file.file, "image", digest=digest, filename=file.filename)
+        result["uploaded_at"] = datetime.utcnow()
+        if not result.get("secure_url"):
+            raise HTTPException(status_code=500, detail="Image URL not returned from Cloudinary")
+
+        full_record = await _publish_and_record_image(user_obj_id, creds, caption, result)
 
         return {
             "message": "Upload successful",
             "data": full_record
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Operation failed: {str(e)}")
 
-@router.post("/upload-video-socialmedia/")
-async def upload_video_file(payload: SocialMediaVideoRequest):
+
+@router.post("/upload-video-socialmedia-file/", status_code=202)
+async def upload_video_stream(
+    user_id: str = Form(...),
+    caption: str = Form(...),
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Multipart variant of /upload-video-socialmedia/; the video is streamed to Cloudinary in chunks."""
+    digest = await content_hash(file.file)
+    return await run_idempotent(
+        idempotency_key,
+        f"upload-video-socialmedia-file:{user_id}",
+        lambda: request_fingerprint(user_id, caption, digest),
+        lambda: _upload_video_stream(user_id, caption, file, digest),
+        status_code=202
+    )
+
+
+async def _upload_video_stream(user_id: str, caption: str, file: UploadFile, digest: str):
     try:
-        # 1. Fetch user credentials
-        user_obj_id = ObjectId(payload.user_id)
-        tenant = await tenant_collection.find_one({"user_id": user_obj_id})
+        try:
+            user_obj_id = ObjectId(user_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid user_id format")
+
+        if not (file.content_type or "").startswith("video/"):
+            raise HTTPException(status_code=400, detail="Uploaded file is not a video")
+
+        tenant = await get_cached_tenant(user_obj_id)
         if not tenant:
             raise HTTPException(status_code=404, detail="Credentials not found")
 
-        insta_creds = tenant.get("insta_credentials", {})
-        fb_creds = tenant.get("facebook_credentials", {})
-        IG_USER_ID = insta_creds.get("IG_USER_ID")
-        ACCESS_TOKENS = insta_creds.get("ACCESS_TOKENS")
-        PAGE_ID = fb_creds.get("PAGE_ID")
-        FACEBOOK_ACCESS = fb_creds.get("FACEBOOK_ACCESS")
+        result = await store_media(
+            file.file,
+            "video",
+            digest=digest,
+            folder="social_videos",
+            filename=file.filename
+        )
+        if not result.get("secure_url"):
+            raise HTTPException(status_code=500, detail="Video URL not returned from Cloudinary")
 
-        # 2. Decode Base64 video to bytes
-        video_bytes = base64.b64decode(payload.base64_video)
-        video_file = io.BytesIO(video_bytes)
+        job_id = await enqueue_video_job(user_obj_id, caption, result)
 
-        # 3. Upload video to Cloudinary
-        result = cloudinary.uploader.upload(
-            video_file,
-            resource_type="video",
-            folder="social_videos"
-        )
-        video_url = result.get("secure_url")
-
-        # 4. Initialize responses
-        insta_response = None
-        fb_response = None
-
-        # 5. Post video to Instagram (REELS)
-        if IG_USER_ID and ACCESS_TOKENS:
-            container_payload = {
-                "media_type": "REELS",
-                "video_url": video_url,
-                "caption": payload.caption,
-                "access_token": ACCESS_TOKENS
-            }
+        return {
+            "message": "Video upload accepted, publishing in background",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upload-signature/")
+async def get_upload_signature(payload: UploadSignatureRequest):
+    """Short-lived signed parameters for uploading media directly to Cloudinary."""
+    if payload.resource_type not in ("image", "video"):
+        raise HTTPException(status_code=400, detail="resource_type must be 'image' or 'video'")
+
+    try:
+        user_obj_id = ObjectId(payload.user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user_id format")
+
+    tenant = await get_cached_tenant(user_obj_id)
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Credentials for this user not found")
+
+    return create_upload_signature(payload.user_id, payload.resource_type)
+
+
+@router.post("/publish-media/")
+async def publish_uploaded_media(payload: PublishMediaRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Publish media the client already uploaded with /upload-signature/; only the Graph API steps run here."""
+    return await run_idempotent(
+        idempotency_key,
+        f"publish-media:{payload.user_id}",
+        lambda: request_fingerprint(payload.user_id, payload.caption, payload.resource_type, payload.public_id),
+        lambda: _publish_uploaded_media(payload)
+    )
+
+
+async def _publish_uploaded_media(payload: PublishMediaRequest):
+    if payload.resource_type not in ("image", "video"):
+        raise HTTPException(status_code=400, detail="resource_type must be 'image' or 'video'")
+
+    try:
+        user_obj_id = ObjectId(payload.user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user_id format")
 
-            container_res = requests.post(
-                f"https://graph.facebook.com/v23.0/{IG_USER_ID}/media",
-                params=container_payload
-            ).json()
-            print("Container response:", container_res)
-
-            if 'id' in container_res:
-                creation_id = container_res['id']
-
-                # Poll until media is ready
-                for _ in range(12):
-                    status_res = requests.get(
-                        f"https://graph.facebook.com/v23.0/{creation_id}",
-                        params={"fields": "status_code", "access_token": ACCESS_TOKENS}
-                    ).json()
-
-                    status = status_res.get("status_code")
-                    if status == "FINISHED":
-                        # Now publish
-                        publish_payload = {
-                            "creation_id": creation_id,
-                            "access_token": ACCESS_TOKENS
-                        }
-                        insta_response = requests.post(
-                            f"https://graph.facebook.com/v23.0/{IG_USER_ID}/media_publish",
-                            params=publish_payload
-                        ).json()
-                        break
-                    elif status == "ERROR":
-                        insta_response = {"error": "Instagram video failed processing"}
-                        break
-
-                    await asyncio.sleep(5)
-
-                if not insta_response:
-                    insta_response = {"error": "Instagram video still processing, try again later."}
-            else:
-                insta_response = container_res
-
-        # 6. Post video to Facebook
-        if PAGE_ID and FACEBOOK_ACCESS:
-            fb_payload = {
-                "file_url": video_url,
-                "description": payload.caption,
-                "access_token": FACEBOOK_ACCESS
+    if not verify_direct_upload(
+        payload.user_id, payload.resource_type, payload.public_id, payload.version, payload.signature
+    ):
+        raise HTTPException(status_code=403, detail="Invalid or expired upload signature")
+
+    try:
+        tenant = await get_cached_tenant(user_obj_id)
+        if not tenant:
+            raise HTTPException(status_code=404, detail="Credentials for this user not found")
+
+        result = {
+            "public_id": payload.public_id,
+            "version": payload.version,
+            "format": DELIVERY_FORMATS[payload.resource_type],
+            "resource_type": payload.resource_type,
+            "secure_url": build_media_url(payload.public_id, payload.resource_type, payload.version),
+            "uploaded_at": datetime.utcnow()
+        }
+
+        if payload.resource_type == "video":
+            job_id = await enqueue_video_job(user_obj_id, payload.caption, result)
+            return {
+                "message": "Video accepted, publishing in background",
+                "job_id": job_id,
+                "status_url": f"/api/jobs/{job_id}"
             }
-            fb_response = requests.post(
-                f"https://graph.facebook.com/v23.0/{PAGE_ID}/videos",
-                data=fb_payload
-            ).json()
 
-        # 7. Save record
-        full_record = {
-            "user_id": user_obj_id,
-            "caption": payload.caption,
-            "uploaded_at": datetime.utcnow(),
-            "cloudinary_response": result,
-            "instagram_response": insta_response,
-            "facebook_response": fb_response
+        full_record = await _publish_and_record_image(
+            user_obj_id, get_platform_credentials(tenant), payload.caption, result
+        )
+        return {
+            "message": "Upload successful",
+            "data": full_record
         }
 
-        insert_result = await social_collection.insert_one(full_record)
-        full_record["_id"] = str(insert_result.inserted_id)
-        full_record["user_id"] = str(full_record["user_id"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Operation failed: {str(e)}")
+
+
+@router.post("/schedule-post/", status_code=201)
+async def create_scheduled_post(payload: ScheduledPostRequest):
+    """Upload the media now and publish it to Instagram/Facebook at publish_at."""
+    if payload.media_type not in ("image", "video"):
+        raise HTTPException(status_code=400, detail="media_type must be 'image' or 'video'")
+
+    try:
+        user_obj_id = ObjectId(payload.user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user_id format")
+
+    publish_at = payload.publish_at
+    if publish_at.tzinfo:
+        publish_at = publish_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    try:
+        tenant = await get_cached_tenant(user_obj_id)
+        if not tenant:
+            raise HTTPException(status_code=404, detail="Credentials for this user not found")
+
+        try:
+            with track_stage("decode"):
+                media_data = base64.b64decode(payload.base64_media)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid base64 media data")
 
-        return {"message": "Video upload successful", "data": full_record}
+        if payload.media_type == "video":
+            result = await store_media(media_data, "video", folder="social_videos")
+        else:
+            result = await store_media(media_data)
+        if not result.get("secure_url"):
+            raise HTTPException(status_code=500, detail="Media URL not returned from Cloudinary")
 
+        schedule_id = await schedule_post(user_obj_id, payload.caption, publish_at, result)
+        return {
+            "message": "Post scheduled",
+            "schedule_id": schedule_id,
+            "publish_at": publish_at
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Operation failed: {str(e)}")
 
 
+@router.get("/scheduled-posts/{schedule_id}")
+async def get_scheduled_post_status(schedule_id: str):
+    try:
+        schedule_obj_id = ObjectId(schedule_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid schedule_id format")
+
+    item = await get_scheduled_post(schedule_obj_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Scheduled post not found")
+
+    return {
+        "schedule_id": str(item["_id"]),
+        "user_id": str(item["user_id"]),
+        "caption": item["caption"],
+        "media_type": item["media_type"],
+        "media_url": item["media_url"],
+        "publish_at": item["publish_at"],
+        "status": item["status"],
+        "attempts": item["attempts"],
+        "post_id": str(item["post_id"]) if item.get("post_id") else None,
+        "job_id": str(item["job_id"]) if item.get("job_id") else None,
+        "error": item.get("error")
+    }
+
+
+@router.delete("/scheduled-posts/{schedule_id}")
+async def delete_scheduled_post(schedule_id: str):
+    try:
+        schedule_obj_id = ObjectId(schedule_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid schedule_id format")
+
+    outcome = await cancel_scheduled_post(schedule_obj_id)
+    if outcome == CANCEL_NOT_FOUND:
+        raise HTTPException(status_code=404, detail="No pending scheduled post with this id")
+    if outcome == CANCEL_IN_PROGRESS:
+        raise HTTPException(status_code=409, detail="This post is being published and can no longer be cancelled")
+    return {"message": "Scheduled post cancelled"}
+
+
+@router.get("/resilience/breakers")
+async def circuit_breaker_states():
+    """Current state of every Graph API / Cloudinary circuit breaker in this worker."""
+    return {"breakers": get_breaker_states()}
+
+
+@router.get("/resilience/quotas")
+async def graph_quota_states():
+    """Graph API call/publish budget and last reported usage per account in this worker."""
+    return {"quotas": get_quota_states()}
+
+
+@router.get("/tenant-cache/stats")
+async def tenant_cache_stats():
+    return get_tenant_cache_stats()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    try:
+        job_obj_id = ObjectId(job_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid job_id format")
+
+    job = await get_video_job(job_obj_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": str(job["_id"]),
+        "user_id": str(job["user_id"]),
+        "status": job["status"],
+        "progress": job.get("progress"),
+        "video_url": job.get("video_url"),
+        "instagram_response": job.get("instagram_response"),
+        "facebook_response": job.get("facebook_response"),
+        "post_id": str(job["post_id"]) if job.get("post_id") else None,
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at")
+    }
+
 
 @router.get("/check-token-expiry/{user_id}")
 async def check_token_expiry(user_id: str):
     try:
-        tenant = await tenant_collection.find_one({"user_id": ObjectId(user_id)})
+        tenant = await get_cached_tenant(ObjectId(user_id))
         if not tenant:
             raise HTTPException(status_code=404, detail="User not found")
 
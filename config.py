@@ -10,6 +10,21 @@ class Settings:
     EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
     EMAIL_FROM = os.getenv("EMAIL_FROM")
     EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME")
+    # Implicit TLS (port 465); otherwise STARTTLS is used when the server offers it
+    EMAIL_USE_SSL = os.getenv("MAIL_SSL", "False").lower() == "true"
+    EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", 2))
+    EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", 20))
+    # Servers drop idle sessions (Gmail after a few minutes); reconnect before that
+    EMAIL_MAX_IDLE_SECONDS = float(os.getenv("EMAIL_MAX_IDLE_SECONDS", 120))
+    # Outbox worker that sends queued emails
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 20))
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL", 5))
+    EMAIL_OUTBOX_LEASE_SECONDS = int(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", 120))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 6))
+    # Longest wait between two attempts at the same message
+    EMAIL_OUTBOX_MAX_BACKOFF = int(os.getenv("EMAIL_OUTBOX_MAX_BACKOFF", 120))
+    # Sent and dead messages are removed after this long
+    EMAIL_OUTBOX_RETENTION_SECONDS = int(os.getenv("EMAIL_OUTBOX_RETENTION_SECONDS", 7 * 24 * 3600))
 
     SECRET_KEY = os.getenv("SECRET_KEY")
     AUTHJWT_SECRET_KEY = os.getenv("AUTHJWT_SECRET_KEY")
@@ -20,6 +35,139 @@ class Settings:
     SQUARE_API_URL = os.getenv("SQUARE_API_URL")
     ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 
+    # Cloudinary media storage
+    CLOUDINARY_CLOUD_NAME = os.getenv("ACLOUD_NAME")
+    CLOUDINARY_API_KEY = os.getenv("API_KEYS")
+    CLOUDINARY_API_SECRET = os.getenv("API_SECRET")
+    CLOUDINARY_MAX_CONCURRENT_UPLOADS = int(os.getenv("CLOUDINARY_MAX_CONCURRENT_UPLOADS", 4))
+    CLOUDINARY_UPLOAD_TIMEOUT = int(os.getenv("CLOUDINARY_UPLOAD_TIMEOUT", 120))
+    # Cloudinary rejects signed uploads older than an hour, so that is the ceiling
+    CLOUDINARY_SIGNATURE_TTL = int(os.getenv("CLOUDINARY_SIGNATURE_TTL", 3600))
+    # Cloudinary requires chunks of at least 5 MB for chunked uploads
+    CLOUDINARY_UPLOAD_CHUNK_SIZE = int(os.getenv("CLOUDINARY_UPLOAD_CHUNK_SIZE", 6 * 1024 * 1024))
+
+    # Image preprocessing before upload (runs in a process pool)
+    IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+    IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", 2))
+    # Instagram serves feed images at most 1440px wide, between 4:5 and 1.91:1
+    IMAGE_MAX_WIDTH = int(os.getenv("IMAGE_MAX_WIDTH", 1440))
+    IMAGE_MIN_ASPECT_RATIO = float(os.getenv("IMAGE_MIN_ASPECT_RATIO", 0.8))
+    IMAGE_MAX_ASPECT_RATIO = float(os.getenv("IMAGE_MAX_ASPECT_RATIO", 1.91))
+    IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 85))
+    # Images are read into memory for preprocessing, so larger ones are refused (413)
+    IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 20 * 1024 * 1024))
+    # Uploads are reused for identical media for this long, then uploaded again
+    MEDIA_INDEX_TTL_SECONDS = int(os.getenv("MEDIA_INDEX_TTL_SECONDS", 7 * 24 * 3600))
+
+    # Facebook / Instagram Graph API client
+    GRAPH_API_VERSION = os.getenv("GRAPH_API_VERSION", "v23.0")
+    GRAPH_API_TIMEOUT = float(os.getenv("GRAPH_API_TIMEOUT", 30))
+    GRAPH_API_CONNECT_TIMEOUT = float(os.getenv("GRAPH_API_CONNECT_TIMEOUT", 5))
+    GRAPH_API_MAX_CONNECTIONS = int(os.getenv("GRAPH_API_MAX_CONNECTIONS", 20))
+    GRAPH_API_MAX_KEEPALIVE = int(os.getenv("GRAPH_API_MAX_KEEPALIVE", 10))
+
+    # In-process tenant credentials cache
+    TENANT_CACHE_SIZE = int(os.getenv("TENANT_CACHE_SIZE", 1024))
+    TENANT_CACHE_TTL = int(os.getenv("TENANT_CACHE_TTL", 300))
+    # Requires a replica set (e.g. Atlas); keeps caches in other workers fresh
+    TENANT_CACHE_CHANGE_STREAM = os.getenv("TENANT_CACHE_CHANGE_STREAM", "false").lower() == "true"
+
+    # Retries and circuit breakers for Graph API and Cloudinary calls
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 3))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 0.5))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 8))
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+    BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+    # Per-account breakers and quotas are dropped after this long without a call,
+    # and at most this many are kept per worker
+    BREAKER_IDLE_TTL = int(os.getenv("BREAKER_IDLE_TTL", 3600))
+    # At least a day, so an idle account does not get its daily publish budget back early
+    GRAPH_QUOTA_IDLE_TTL = int(os.getenv("GRAPH_QUOTA_IDLE_TTL", 24 * 3600))
+    ACCOUNT_STATE_MAX_ENTRIES = int(os.getenv("ACCOUNT_STATE_MAX_ENTRIES", 10000))
+
+    # Metrics
+    EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", 0.5))
+
+    # Per-account Graph API quotas (token buckets keyed by IG_USER_ID / PAGE_ID).
+    # The local bucket is only a safety net; Graph's usage headers do the real
+    # throttling. The defaults refill a call every 3s, well inside
+    # GRAPH_QUOTA_MAX_WAIT, so an image publish (2-3 calls) or a reel with a
+    # dozen status polls never fails on budget alone. A refill interval
+    # (3600 / GRAPH_CALLS_PER_HOUR) above GRAPH_QUOTA_MAX_WAIT would turn every
+    # call after the burst into a QuotaExceededError.
+    GRAPH_CALLS_PER_HOUR = int(os.getenv("GRAPH_CALLS_PER_HOUR", 1200))
+    GRAPH_CALL_BURST = int(os.getenv("GRAPH_CALL_BURST", 50))
+    INSTAGRAM_PUBLISHES_PER_DAY = int(os.getenv("INSTAGRAM_PUBLISHES_PER_DAY", 50))
+    FACEBOOK_PUBLISHES_PER_DAY = int(os.getenv("FACEBOOK_PUBLISHES_PER_DAY", 100))
+    # Slow down once the usage headers report this percentage of any limit used
+    GRAPH_USAGE_THRESHOLD = int(os.getenv("GRAPH_USAGE_THRESHOLD", 85))
+    # Longest a request will wait for quota before failing with a retry-after
+    GRAPH_QUOTA_MAX_WAIT = float(os.getenv("GRAPH_QUOTA_MAX_WAIT", 10))
+
+    # Background video publishing jobs
+    VIDEO_JOB_CONCURRENCY = int(os.getenv("VIDEO_JOB_CONCURRENCY", 4))
+    VIDEO_JOB_POLL_INTERVAL = int(os.getenv("VIDEO_JOB_POLL_INTERVAL", 5))
+    VIDEO_JOB_MAX_STATUS_CHECKS = int(os.getenv("VIDEO_JOB_MAX_STATUS_CHECKS", 12))
+    VIDEO_JOB_LEASE_SECONDS = int(os.getenv("VIDEO_JOB_LEASE_SECONDS", 120))
+    VIDEO_JOB_MAX_ATTEMPTS = int(os.getenv("VIDEO_JOB_MAX_ATTEMPTS", 3))
+    VIDEO_JOB_IDLE_SLEEP = float(os.getenv("VIDEO_JOB_IDLE_SLEEP", 2))
+
+    # Scheduled posts
+    SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", 50))
+    SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", 8))
+    SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", 5))
+    SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", 300))
+    SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", 3))
+
+    # Bulk multi-tenant publishing
+    BULK_PUBLISH_CONCURRENCY = int(os.getenv("BULK_PUBLISH_CONCURRENCY", 5))
+    BULK_PUBLISH_MAX_TENANTS = int(os.getenv("BULK_PUBLISH_MAX_TENANTS", 200))
+
+    # Idempotency-Key support on posting endpoints
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+    # An in-progress key older than this is assumed abandoned and can be taken over
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 600))
+
+    # Google sign-in token verification
+    GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+    GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+    # Refresh the signing certs this long before their Cache-Control max-age runs out
+    GOOGLE_CERTS_REFRESH_MARGIN = int(os.getenv("GOOGLE_CERTS_REFRESH_MARGIN", 300))
+    GOOGLE_TOKEN_CLOCK_SKEW = int(os.getenv("GOOGLE_TOKEN_CLOCK_SKEW", 10))
+    # Tokens with an unknown key id refetch the certs at most this often
+    GOOGLE_CERTS_MIN_REFRESH_INTERVAL = int(os.getenv("GOOGLE_CERTS_MIN_REFRESH_INTERVAL", 60))
+
+    # One-time codes (password reset / email verification)
+    OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", 600))
+    OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", 5))
+    # Key for hashing stored codes; falls back to SECRET_KEY
+    OTP_HMAC_KEY = os.getenv("OTP_HMAC_KEY") or os.getenv("SECRET_KEY") or ""
+
+    # Auth endpoint rate limits as "<requests>/<seconds>", per client IP and per email
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    # "memory" (per worker process) or "mongo" (shared by every worker)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    # Proxies in front of the app that append to X-Forwarded-For. The client IP is
+    # the entry this many places from the right, since everything left of it is
+    # client supplied. Behind Render's proxy (render.yaml) this must be 1, or every
+    # client is limited as the proxy's address. 0 uses the socket peer address.
+    RATE_LIMIT_TRUSTED_PROXY_HOPS = int(os.getenv("RATE_LIMIT_TRUSTED_PROXY_HOPS", 0))
+    # Keys kept per window by the in-memory backend; the least recently used go first
+    RATE_LIMIT_MEMORY_MAX_KEYS = int(os.getenv("RATE_LIMIT_MEMORY_MAX_KEYS", 100000))
+    RATE_LIMIT_SIGNIN_IP = os.getenv("RATE_LIMIT_SIGNIN_IP", "20/60")
+    RATE_LIMIT_SIGNIN_EMAIL = os.getenv("RATE_LIMIT_SIGNIN_EMAIL", "10/900")
+    RATE_LIMIT_SIGNUP_IP = os.getenv("RATE_LIMIT_SIGNUP_IP", "10/3600")
+    RATE_LIMIT_SIGNUP_EMAIL = os.getenv("RATE_LIMIT_SIGNUP_EMAIL", "3/3600")
+    RATE_LIMIT_FORGOT_PASS_IP = os.getenv("RATE_LIMIT_FORGOT_PASS_IP", "10/3600")
+    RATE_LIMIT_FORGOT_PASS_EMAIL = os.getenv("RATE_LIMIT_FORGOT_PASS_EMAIL", "3/900")
+    RATE_LIMIT_VERIFY_OTP_IP = os.getenv("RATE_LIMIT_VERIFY_OTP_IP", "30/900")
+    RATE_LIMIT_VERIFY_OTP_EMAIL = os.getenv("RATE_LIMIT_VERIFY_OTP_EMAIL", "10/900")
+
+    # Password hashing worker pool ("thread" or "process")
+    PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+    PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+
 
 
 
@@ -0,0 +1,132 @@
+"""
+Index registry for every collection the API queries.
+
+Indexes are applied from the app lifespan at startup. To check a database
+without changing it, run:
+
+    python -m database.indexes --dry-run
+"""
+import argparse
+import asyncio
+from pymongo import ASCENDING, IndexModel
+from config import settings
+from database.mongo import get_collection
+
+INDEXES = {
+    "users_info": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "tenant": [
+        # One tenant document per user; credential saves rely on this for their upserts
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "social": [
+        # Also the sort key for keyset pagination in /posts/{user_id}
+        IndexModel([("user_id", ASCENDING), ("uploaded_at", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "video_jobs": [
+        IndexModel([("status", ASCENDING), ("next_run_at", ASCENDING)]),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.IDEMPOTENCY_TTL_SECONDS),
+    ],
+    "scheduled_posts": [
+        IndexModel([("status", ASCENDING), ("due_at", ASCENDING)]),
+    ],
+    "otp_codes": [
+        IndexModel([("email", ASCENDING), ("purpose", ASCENDING)], unique=True),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "media_index": [
+        # Expired entries make the next identical upload go to Cloudinary again
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.MEDIA_INDEX_TTL_SECONDS),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("due_at", ASCENDING)]),
+        # Set once a message is sent or dead-lettered
+        IndexModel([("purge_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+
+# Index options that change behaviour; an index with the right keys but other
+# values for these is not the index the code relies on
+COMPARED_OPTIONS = ("unique", "expireAfterSeconds", "sparse", "partialFilterExpression")
+
+
+def _key_of(keys) -> tuple:
+    return tuple((field, direction) for field, direction in keys)
+
+
+def _options_of(info: dict) -> dict:
+    options = {option: info.get(option) for option in COMPARED_OPTIONS}
+    # A missing flag and an explicit False mean the same thing
+    options["unique"] = bool(options["unique"])
+    options["sparse"] = bool(options["sparse"])
+    if options["expireAfterSeconds"] is not None:
+        options["expireAfterSeconds"] = int(options["expireAfterSeconds"])
+    return options
+
+
+async def ensure_indexes(dry_run: bool = False):
+    """
+    Create any registered index that is missing.
+
+    Returns one report entry per registered index with a status of "exists",
+    "missing" (dry run), "created", "failed" or "mismatch". A failure, such as
+    duplicate emails blocking a unique index, does not stop the remaining
+    indexes. "mismatch" means an index on the same keys exists with different
+    options (e.g. not unique, or another TTL); it is left alone, since it has
+    to be dropped by hand before the registered one can be created.
+    """
+    report = []
+    for collection_name, models in INDEXES.items():
+        collection = get_collection(collection_name)
+        existing = {
+            _key_of(info["key"]): info for info in (await collection.index_information()).values()
+        }
+        for model in models:
+            spec = model.document
+            entry = {"collection": collection_name, "index": spec["name"], "unique": spec.get("unique", False)}
+            current = existing.get(_key_of(spec["key"].items()))
+            if current is not None:
+                wanted, found = _options_of(spec), _options_of(current)
+                if wanted == found:
+                    entry["status"] = "exists"
+                else:
+                    entry["status"] = "mismatch"
+                    entry["error"] = f"expected {wanted}, found {found}"
+            elif dry_run:
+                entry["status"] = "missing"
+            else:
+                try:
+                    await collection.create_indexes([model])
+                    entry["status"] = "created"
+                except Exception as e:
+                    entry["status"] = "failed"
+                    entry["error"] = str(e)
+            report.append(entry)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the MongoDB index registry")
+    parser.add_argument("--dry-run", action="store_true", help="only report missing indexes")
+    args = parser.parse_args()
+
+    report = asyncio.run(ensure_indexes(dry_run=args.dry_run))
+    for entry in report:
+        line = f"{entry['collection']}.{entry['index']}: {entry['status']}"
+        if entry.get("error"):
+            line += f" ({entry['error']})"
+        print(line)
+
+    if any(entry["status"] in ("missing", "failed", "mismatch") for entry in report):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+One-time migration of "social" documents to the compact post schema.
+
+Raw Cloudinary/Graph API responses move to "social_raw" under the same _id,
+and the post document is replaced by its compact form. The migration is
+idempotent: it only picks up documents that still embed the raw responses,
+so it can be stopped and re-run safely.
+
+    python -m database.migrate_posts --dry-run
+    python -m database.migrate_posts --batch-size 500
+"""
+import argparse
+import asyncio
+from pymongo import ReplaceOne
+from database.mongo import get_collection
+from services.posts import build_compact_post, build_raw_record
+
+social_collection = get_collection("social")
+social_raw_collection = get_collection("social_raw")
+
+LEGACY_FILTER = {"cloudinary_response": {"$exists": True}}
+
+
+async def migrate_posts(batch_size: int = 500, dry_run: bool = False) -> int:
+    if dry_run:
+        return await social_collection.count_documents(LEGACY_FILTER)
+
+    migrated = 0
+    while True:
+        legacy_posts = await social_collection.find(LEGACY_FILTER) \
+            .limit(batch_size) \
+            .to_list(length=batch_size)
+        if not legacy_posts:
+            return migrated
+
+        raw_writes, post_writes = [], []
+        for legacy in legacy_posts:
+            raw = build_raw_record(
+                legacy["_id"],
+                legacy.get("user_id"),
+                legacy.get("cloudinary_response"),
+                legacy.get("instagram_response"),
+                legacy.get("facebook_response"),
+            )
+            post = build_compact_post(
+                legacy.get("user_id"),
+                legacy.get("caption"),
+                legacy.get("cloudinary_response"),
+                legacy.get("instagram_response"),
+                legacy.get("facebook_response"),
+                uploaded_at=legacy.get("uploaded_at"),
+            )
+            raw_writes.append(ReplaceOne({"_id": legacy["_id"]}, raw, upsert=True))
+            # Only replace documents that are still in the legacy shape
+            post_writes.append(ReplaceOne({"_id": legacy["_id"], **LEGACY_FILTER}, post))
+
+        # Archive first, so an interrupted batch never loses the raw responses
+        await social_raw_collection.bulk_write(raw_writes, ordered=False)
+        await social_collection.bulk_write(post_writes, ordered=False)
+        migrated += len(legacy_posts)
+        print(f"Migrated {migrated} posts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move raw API responses out of social posts")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only count posts left to migrate")
+    args = parser.parse_args()
+
+    count = asyncio.run(migrate_posts(batch_size=args.batch_size, dry_run=args.dry_run))
+    if args.dry_run:
+        print(f"{count} posts still use the legacy schema")
+    else:
+        print(f"Done, {count} posts migrated")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
+from services.metrics import MongoCommandMetrics
 
 load_dotenv()
 
@@ -11,7 +12,7 @@ print("Using MongoDB URI:", MONGO_URI)
 
 DATABASE_NAME = "social_media"
 
-client = AsyncIOMotorClient(MONGO_URI)
+client = AsyncIOMotorClient(MONGO_URI, event_listeners=[MongoCommandMetrics()])
 db = client[DATABASE_NAME]
 
 
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+import aiosmtplib
+from bson import ObjectId
+from config import settings
+from database.mongo import get_collection
+from emailsetup.transport import send_template_email
+
+email_outbox_collection = get_collection("email_outbox")
+
+# Message lifecycle: "queued" -> "sent" | "dead".
+# Endpoints only insert a queued message; the worker claims due messages in
+# batches by pushing due_at forward by the lease (as the post scheduler does),
+# so a worker that dies mid-batch leaves its messages to be picked up again.
+# Failed sends are retried with backoff until EMAIL_OUTBOX_MAX_ATTEMPTS, then
+# dead-lettered. A message with an expires_at (a code that stops working) is
+# dead-lettered instead once it could only arrive after that. The template context (which holds codes) is removed once a
+# message is sent or dead, and purge_at lets a TTL index drop the record.
+EMAIL_QUEUED = "queued"
+EMAIL_SENT = "sent"
+EMAIL_DEAD = "dead"
+
+# The server refused the message itself; retrying will not change that
+PERMANENT_ERRORS = (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPSenderRefused)
+
+_wakeup = asyncio.Event()
+
+
+async def enqueue_email(recipients: List[str], subject: str, template: str, context: dict,
+                        expires_at: datetime = None) -> str:
+    now = datetime.utcnow()
+    result = await email_outbox_collection.insert_one({
+        "recipients": recipients,
+        "subject": subject,
+        "template": template,
+        "context": context,
+        "status": EMAIL_QUEUED,
+        "attempts": 0,
+        "due_at": now,
+        "expires_at": expires_at,
+        "created_at": now,
+        "updated_at": now,
+    })
+    # Don't make a password reset wait for the next poll in this worker
+    _wakeup.set()
+    return str(result.inserted_id)
+
+
+async def _claim_due_batch():
+    now = datetime.utcnow()
+    due = await email_outbox_collection.find(
+        {"status": EMAIL_QUEUED, "due_at": {"$lte": now}}, {"_id": 1}
+    ).sort("due_at", 1).limit(settings.EMAIL_OUTBOX_BATCH_SIZE).to_list(length=settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not due:
+        return []
+
+    ids = [doc["_id"] for doc in due]
+    claim_token = ObjectId()
+    await email_outbox_collection.update_many(
+        {"_id": {"$in": ids}, "status": EMAIL_QUEUED, "due_at": {"$lte": now}},
+        {"$set": {
+            "due_at": now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+            "claim_token": claim_token,
+        }},
+    )
+    return await email_outbox_collection.find(
+        {"_id": {"$in": ids}, "claim_token": claim_token}
+    ).to_list(length=len(ids))
+
+
+async def _finish(message: dict, fields: dict, unset_context: bool = False):
+    now = datetime.utcnow()
+    fields["updated_at"] = now
+    update = {"$set": fields}
+    if unset_context:
+        fields["purge_at"] = now + timedelta(seconds=settings.EMAIL_OUTBOX_RETENTION_SECONDS)
+        update["$unset"] = {"context": ""}
+    await email_outbox_collection.update_one(
+        {"_id": message["_id"], "claim_token": message["claim_token"]}, update
+    )
+
+
+async def _deliver(message: dict):
+    attempts = message["attempts"] + 1
+    expires_at = message.get("expires_at")
+    if expires_at and expires_at <= datetime.utcnow():
+        await _finish(message, {"status": EMAIL_DEAD, "error": "Expired before it could be sent"},
+                      unset_context=True)
+        return
+
+    try:
+        await send_template_email(
+            message["recipients"], message["subject"], message["template"], **message["context"]
+        )
+    except Exception as e:
+        print(f"Email {message['_id']} failed (attempt {attempts}): {e}")
+        fields = {"attempts": attempts, "error": str(e)}
+        due_at = datetime.utcnow() + timedelta(
+            seconds=min(15 * 2 ** attempts, settings.EMAIL_OUTBOX_MAX_BACKOFF)
+        )
+        if (isinstance(e, PERMANENT_ERRORS) or attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+                or (expires_at and due_at >= expires_at)):
+            fields["status"] = EMAIL_DEAD
+            await _finish(message, fields, unset_context=True)
+        else:
+            fields["due_at"] = due_at
+            await _finish(message, fields)
+        return
+
+    await _finish(message, {"status": EMAIL_SENT, "attempts": attempts, "sent_at": datetime.utcnow()},
+                  unset_context=True)
+
+
+async def run_email_outbox_worker():
+    """Send queued emails in batches over the pooled SMTP transport."""
+    while True:
+        _wakeup.clear()
+        try:
+            batch = await _claim_due_batch()
+        except Exception as e:
+            print(f"Email outbox could not claim messages: {e}")
+            batch = []
+
+        if batch:
+            # The SMTP pool limits how many of these are actually in flight
+            await asyncio.gather(*(_deliver(message) for message in batch), return_exceptions=True)
+            continue
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.EMAIL_OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import List
+import aiosmtplib
+from jinja2 import Environment, select_autoescape, PackageLoader
+from config import settings
+
+env = Environment(
+    loader=PackageLoader("templates", ""),
+    autoescape=select_autoescape(["html"]),
+)
+
+# Compiled once at import instead of on every send
+TEMPLATES = {
+    name: env.get_template(f"{name}.html")
+    for name in ("verification", "forgotPass")
+}
+
+# Errors after which the connection cannot be trusted for another message
+CONNECTION_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+    OSError,
+)
+
+
+def render_template(template: str, **context) -> str:
+    return TEMPLATES[template].render(**context)
+
+
+def build_message(recipients: List[str], subject: str, html: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = formataddr((settings.EMAIL_FROM_NAME or "", settings.EMAIL_FROM))
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = subject
+    message.set_content(html, subtype="html")
+    return message
+
+
+class SMTPPool:
+    """
+    Authenticated SMTP sessions kept open between sends.
+
+    At most EMAIL_POOL_SIZE sessions exist at a time. A session that has been
+    idle for longer than EMAIL_MAX_IDLE_SECONDS, or that failed mid-send, is
+    closed and replaced, so a send never goes out on a connection the server
+    has already dropped.
+    """
+
+    def __init__(self, size: int):
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []  # (smtp, last_used)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.EMAIL_HOST,
+            port=settings.EMAIL_PORT,
+            username=settings.EMAIL_USERNAME,
+            password=settings.EMAIL_PASSWORD,
+            use_tls=settings.EMAIL_USE_SSL,
+            timeout=settings.EMAIL_TIMEOUT,
+        )
+        # connect() also runs STARTTLS and login
+        await smtp.connect()
+        return smtp
+
+    @staticmethod
+    def _discard(smtp: aiosmtplib.SMTP):
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+    async def _checkout(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            smtp, last_used = self._idle.pop()
+            if smtp.is_connected and time.monotonic() - last_used < settings.EMAIL_MAX_IDLE_SECONDS:
+                return smtp
+            self._discard(smtp)
+        return await self._connect()
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._slots:
+            smtp = await self._checkout()
+            try:
+                yield smtp
+            except CONNECTION_ERRORS:
+                self._discard(smtp)
+                raise
+            except Exception:
+                # The server rejected the message, but the session is still usable
+                self._idle.append((smtp, time.monotonic()))
+                raise
+            else:
+                self._idle.append((smtp, time.monotonic()))
+
+    async def send(self, message: EmailMessage):
+        """Send one message, retrying once on a fresh session if the pooled one broke."""
+        try:
+            async with self.connection() as smtp:
+                return await smtp.send_message(message)
+        except CONNECTION_ERRORS as e:
+            print(f"SMTP connection failed, reconnecting: {e}")
+        async with self.connection() as smtp:
+            return await smtp.send_message(message)
+
+    async def close(self):
+        while self._idle:
+            smtp, _ = self._idle.pop()
+            try:
+                await smtp.quit()
+            except Exception:
+                self._discard(smtp)
+
+
+_pool = None
+
+
+def get_mail_transport() -> SMTPPool:
+    global _pool
+    if _pool is None:
+        _pool = SMTPPool(settings.EMAIL_POOL_SIZE)
+    return _pool
+
+
+async def send_template_email(recipients: List[str], subject: str, template: str, **context):
+    html = render_template(template, subject=subject, **context)
+    await get_mail_transport().send(build_message(recipients, subject, html))
+
+
+async def close_mail_transport():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -1,53 +1,47 @@
+from datetime import datetime
 from typing import List
 from fastapi import HTTPException
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from jinja2 import Environment, select_autoescape, PackageLoader
 from pydantic import EmailStr
 from starlette import status
-from config import settings
+from emailsetup.outbox import enqueue_email
+from emailsetup.transport import send_template_email
 
-env = Environment(
-    loader=PackageLoader("templates", ""),
-    autoescape=select_autoescape(["html"]),
-)
 
+class TemplateEmail:
+    """A code email rendered from one of the precompiled templates and sent over the shared SMTP pool."""
 
-class VerifyEmail:
-    # print("enter VerifyEmail")
-
-    def __init__(self, name: str, code: int, email: List[str]):
+    def __init__(self, name: str, code, email: List[str]):
         self.name = name
         self.email = email
         self.code = code
 
     async def sendMail(self, subject, template):
-        try:
-            print("enter VerifyEmail")
-            # Define the emailsetup config
-            conf = ConnectionConfig(
-                MAIL_USERNAME=settings.EMAIL_USERNAME,
-                MAIL_PASSWORD=settings.EMAIL_PASSWORD,
-                MAIL_FROM=settings.EMAIL_FROM,
-                MAIL_PORT=settings.EMAIL_PORT,
-                MAIL_SERVER=settings.EMAIL_HOST,
-                MAIL_FROM_NAME=settings.EMAIL_FROM_NAME,
-                MAIL_TLS=True,
-                MAIL_SSL=False,
-            )
-            # Generate the HTML templates
-            template = env.get_template(f"{template}.html")
-            html = template.render(code=self.code, first_name=self.name, subject=subject)
+        await send_template_email(
+            self.email, subject, template, code=self.code, first_name=self.name
+        )
 
-            # Define the message options
-            message = MessageSchema(
-                subject=subject, recipients=self.email, body=html, subtype="html",
-            )
+    async def queueMail(self, subject, template, expires_at: datetime = None) -> str:
+        """
+        Write the email to the outbox for the background worker to send; returns its id.
 
-            # Send the emailsetup
-            fm = FastMail(conf)
-            await fm.send_message(message)
-            print("Email sent successfully!")
+        Pass the code's expiry as expires_at so the email is dropped rather than
+        delivered with a code that no longer works.
+        """
+        return await enqueue_email(
+            self.email, subject, template, {"code": self.code, "first_name": self.name},
+            expires_at=expires_at,
+        )
+
+
+class VerifyEmail(TemplateEmail):
 
+    def __init__(self, name: str, code: int, email: List[str]):
+        super().__init__(name, code, email)
+
+    async def sendMail(self, subject, template):
+        try:
+            await super().sendMail(subject, template)
+            print("Email sent successfully!")
         except Exception as e:
             print(f"Failed to send emailsetup: {e}")
             raise HTTPException(
@@ -56,47 +50,16 @@ class VerifyEmail:
             )
 
     async def sendVerificationCode(self):
-        print("enter VerifyEmail")
         await self.sendMail("Welcome to Shopana.ai! Please Verify Your Email", "verification")
 
 
-class ForgotPassEmail:
-    print('enter ForgotPassEmail from auth')
+class ForgotPassEmail(TemplateEmail):
 
     def __init__(self, name: str, code: str, email: List[EmailStr]):
-        self.name = name
-        self.email = email
-        self.code = code
-        pass
-
-    async def sendMail(self, subject, template):
-        # Define the config
-        print('enter sendMail')
-        conf = ConnectionConfig(
-            MAIL_USERNAME=settings.EMAIL_USERNAME,
-            MAIL_PASSWORD=settings.EMAIL_PASSWORD,
-            MAIL_FROM=settings.EMAIL_FROM,
-            MAIL_PORT=settings.EMAIL_PORT,
-            MAIL_SERVER=settings.EMAIL_HOST,
-            MAIL_FROM_NAME=settings.EMAIL_FROM_NAME,
-            MAIL_STARTTLS=True,
-            MAIL_SSL_TLS=False,
-        )
-        # Generate the HTML templates base on the templates name
-        template = env.get_template(f"{template}.html")
-
-        html = template.render(code=self.code, first_name=self.name, subject=subject)
-
-        # Define the message options
-        message = MessageSchema(
-            subject=subject, recipients=self.email, body=html, subtype="html"
-        )
-
-        # Send the emailsetup
-        fm = FastMail(conf)
-        await fm.send_message(message)
-        print('enter ForgotPassEmail')
+        super().__init__(name, code, email)
 
     async def sendVerificationCode(self):
-        print('enter sendVerificationCode')
         await self.sendMail("Password Reset Confirmation", "forgotPass")
+
+    async def queueVerificationCode(self, expires_at: datetime = None) -> str:
+        return await self.queueMail("Password Reset Confirmation", "forgotPass", expires_at)
@@ -1,15 +1,61 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from starlette.middleware.cors import CORSMiddleware
 from apis.social_media import router as social_router
 from apis.auth import router as auth_router
+from apis.posts import router as posts_router
 from dotenv import load_dotenv
 from jwt_config import get_jwt_config
+from utils import shutdown_password_hasher
+from services.media_storage import shutdown_media_storage
+from services.image_processing import shutdown_image_processing
+from services.graph_client import close_graph_client
+from emailsetup.transport import close_mail_transport
+from emailsetup.outbox import run_email_outbox_worker
+from services.google_auth import close_google_verifier, get_google_verifier
+from services.video_jobs import run_video_job_worker
+from services.tenant_cache import watch_tenant_changes
+from services.scheduler import run_scheduler
+from services.metrics import monitor_event_loop_lag, record_request_metrics, render_metrics, mark_worker_exit
+from config import settings
+from database.indexes import ensure_indexes
 
 # Load environment variables
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        for entry in await ensure_indexes():
+            if entry["status"] != "exists":
+                print(f"Index {entry['collection']}.{entry['index']}: {entry['status']} {entry.get('error', '')}")
+    except Exception as e:
+        print(f"Could not create MongoDB indexes: {e}")
+    background_tasks = [
+        asyncio.create_task(run_video_job_worker()),
+        asyncio.create_task(run_scheduler()),
+        asyncio.create_task(run_email_outbox_worker()),
+        asyncio.create_task(monitor_event_loop_lag()),
+        asyncio.create_task(get_google_verifier().run_refresher()),
+    ]
+    if settings.TENANT_CACHE_CHANGE_STREAM:
+        background_tasks.append(asyncio.create_task(watch_tenant_changes()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await close_graph_client()
+    await close_mail_transport()
+    await close_google_verifier()
+    shutdown_password_hasher()
+    shutdown_media_storage()
+    shutdown_image_processing()
+    mark_worker_exit()
+
+
 # Create FastAPI instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,11 +65,19 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.middleware("http")(record_request_metrics)
 # Include the router
 app.include_router(auth_router, prefix="/api",tags=["Authentication"])
 app.include_router(social_router, prefix="/api",tags=["post"])
+app.include_router(posts_router, prefix="/api",tags=["post"])
 
 
 @app.get("/")
 async def health_check():
     return {"status": "Health_check"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, constr
 from datetime import datetime
 
@@ -33,6 +33,7 @@ class ForgotPasswordSchema(BaseModel):
 class VerifyOTPSchema(BaseModel):
     email: str
     otp: str
+    purpose: Optional[str] = "password_reset"
 
 
 class ResetPasswordSchema(BaseModel):
@@ -70,3 +71,32 @@ class SocialMediaVideoRequest(BaseModel):
     caption: str
     base64_video: str
 
+
+class UploadSignatureRequest(BaseModel):
+    user_id: str
+    resource_type: str = "image"  # "image" or "video"
+
+
+class PublishMediaRequest(BaseModel):
+    user_id: str
+    caption: str
+    resource_type: str = "image"  # "image" or "video"
+    # Fields from Cloudinary's response to the client's direct upload
+    public_id: str
+    version: str
+    format: Optional[str] = None  # ignored; media is delivered as jpg/mp4
+    signature: str
+
+
+class ScheduledPostRequest(BaseModel):
+    user_id: str
+    caption: str
+    publish_at: datetime
+    media_type: str = "image"  # "image" or "video"
+    base64_media: str
+
+
+class BulkSocialMediaRequest(BaseModel):
+    user_ids: List[str]
+    caption: str
+    base64_image: str
@@ -0,0 +1,136 @@
+import asyncio
+import re
+import time
+from typing import Awaitable, Callable, Optional, Tuple
+import httpx
+from google.auth import jwt
+from config import settings
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Used when the certs response carries no usable Cache-Control header
+DEFAULT_CERTS_MAX_AGE = 3600
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+# An async callable returning ({key id: PEM certificate}, max age in seconds)
+CertsFetcher = Callable[[], Awaitable[Tuple[dict, float]]]
+
+
+def _max_age(cache_control: str) -> float:
+    match = MAX_AGE_PATTERN.search(cache_control or "")
+    return float(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+
+
+class GoogleTokenVerifier:
+    """
+    Verifies Google sign-in ID tokens without blocking the event loop.
+
+    Google's signing certificates are cached for as long as their
+    Cache-Control max-age allows and fetched over one shared HTTP client;
+    run_refresher() renews them in the background before they expire, so
+    requests normally never wait on Google. A token signed with a key that
+    is not cached yet (key rotation) triggers an immediate refresh, at most
+    once per GOOGLE_CERTS_MIN_REFRESH_INTERVAL, so forged key ids cannot
+    make every login fetch the certs.
+
+    Tests can point certs_url at a local stub, or pass fetch_certs to skip
+    HTTP entirely.
+    """
+
+    def __init__(self, audience: Optional[str], certs_url: str = None,
+                 fetch_certs: CertsFetcher = None):
+        self.audience = audience
+        self.certs_url = certs_url or settings.GOOGLE_CERTS_URL
+        self._fetch_certs = fetch_certs or self._fetch_certs_http
+        self._client = None
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetched_at = None
+        self._lock = asyncio.Lock()
+
+    async def _fetch_certs_http(self) -> Tuple[dict, float]:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(10, connect=5))
+        response = await self._client.get(self.certs_url)
+        response.raise_for_status()
+        return response.json(), _max_age(response.headers.get("cache-control"))
+
+    async def refresh_certs(self) -> dict:
+        certs, max_age = await self._fetch_certs()
+        self._certs = certs
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + max_age
+        return certs
+
+    async def get_certs(self, force: bool = False) -> dict:
+        if not force and self._certs is not None and time.monotonic() < self._expires_at:
+            return self._certs
+        # One fetch serves every request that was waiting on it
+        fetched_at = self._expires_at
+        async with self._lock:
+            if self._expires_at != fetched_at and self._certs is not None:
+                return self._certs
+            return await self.refresh_certs()
+
+    def _decode(self, token: str, certs: dict) -> dict:
+        return jwt.decode(
+            token,
+            certs=certs,
+            audience=self.audience,
+            clock_skew_in_seconds=settings.GOOGLE_TOKEN_CLOCK_SKEW,
+        )
+
+    async def verify(self, token: str) -> dict:
+        """Return the token's claims; raises ValueError if it is not a valid Google ID token."""
+        certs = await self.get_certs()
+        try:
+            claims = await asyncio.to_thread(self._decode, token, certs)
+        except ValueError as e:
+            if "Certificate for key id" not in str(e):
+                raise
+            recently_fetched = (
+                self._fetched_at is not None
+                and time.monotonic() - self._fetched_at < settings.GOOGLE_CERTS_MIN_REFRESH_INTERVAL
+            )
+            if recently_fetched:
+                raise
+            certs = await self.get_certs(force=True)
+            claims = await asyncio.to_thread(self._decode, token, certs)
+
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+        return claims
+
+    async def run_refresher(self):
+        """Keep the certs fresh so that verify() never has to fetch them."""
+        while True:
+            if self._certs is not None:
+                wait = self._expires_at - time.monotonic() - settings.GOOGLE_CERTS_REFRESH_MARGIN
+                # Even with a very short max-age, don't poll Google in a tight loop
+                await asyncio.sleep(max(wait, 60))
+            try:
+                await self.get_certs(force=True)
+            except Exception as e:
+                print(f"Could not refresh Google signing certs: {e}")
+                await asyncio.sleep(60)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_verifier = None
+
+
+def get_google_verifier() -> GoogleTokenVerifier:
+    global _verifier
+    if _verifier is None:
+        _verifier = GoogleTokenVerifier(settings.GOOGLE_CLIENT_ID)
+    return _verifier
+
+
+async def close_google_verifier():
+    global _verifier
+    if _verifier is not None:
+        await _verifier.close()
+        _verifier = None
@@ -0,0 +1,142 @@
+import asyncio
+import httpx
+from config import settings
+from services import graph_quota
+from services.resilience import breakers_for, check_breakers, record_outcome, retry_delay
+
+GRAPH_API_URL = f"https://graph.facebook.com/{settings.GRAPH_API_VERSION}/"
+
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2]); fall back
+# to pooled HTTP/1.1 keep-alive connections when it is not installed.
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# Graph error codes for app-wide throttling, for temporary failures, and for
+# throttling of a single user/page/business account
+# https://developers.facebook.com/docs/graph-api/guides/error-handling
+PLATFORM_THROTTLE_CODES = {4, 341}
+PLATFORM_TRANSIENT_CODES = {1, 2} | PLATFORM_THROTTLE_CODES
+ACCOUNT_THROTTLE_CODES = set(range(80001, 80015)) | {17, 32, 613}
+
+_client = None
+
+
+def get_graph_client() -> httpx.AsyncClient:
+    """Shared client for graph.facebook.com, created on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=GRAPH_API_URL,
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=settings.GRAPH_API_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GRAPH_API_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(
+                settings.GRAPH_API_TIMEOUT, connect=settings.GRAPH_API_CONNECT_TIMEOUT
+            ),
+        )
+    return _client
+
+
+def _decode(response: httpx.Response) -> dict:
+    try:
+        return response.json()
+    except ValueError:
+        # Proxies and outages can answer with HTML; keep the Graph error shape
+        return {"error": {"message": response.text, "code": response.status_code}}
+
+
+def _transient_scope(status_code: int, payload: dict):
+    """None for success or a permanent error, else "platform" or "account"."""
+    error = payload.get("error")
+    code = error.get("code") if isinstance(error, dict) else None
+    if code in ACCOUNT_THROTTLE_CODES:
+        return "account"
+    if status_code >= 500 or status_code == 429 or code in PLATFORM_TRANSIENT_CODES:
+        return "platform"
+    if isinstance(error, dict) and error.get("is_transient") is True:
+        return "platform"
+    return None
+
+
+def _throttled(status_code: int, payload: dict) -> bool:
+    """True when Graph rejected the call for rate limits, so it was not carried out."""
+    error = payload.get("error")
+    code = error.get("code") if isinstance(error, dict) else None
+    return status_code == 429 or code in PLATFORM_THROTTLE_CODES or code in ACCOUNT_THROTTLE_CODES
+
+
+async def _request(method: str, path: str, platform: str, account: str,
+                   publish: bool = False, **kwargs) -> dict:
+    """
+    Send a Graph API request with retries and circuit breakers.
+
+    Transient failures (connection errors, 5xx, throttling codes) are retried
+    with jittered exponential backoff up to RETRY_MAX_ATTEMPTS times and count
+    against the account breaker and, unless only that account is throttled,
+    the platform breaker. When they run out, the
+    last Graph error payload is returned, just as for any other API error.
+    A POST that timed out after being sent is never retried, because Graph
+    may already have acted on it. For the same reason a publish is only
+    retried when it was throttled; a 5xx or unknown error is returned as is.
+
+    Every attempt first waits for the account's call budget (and, for the
+    first attempt of a publish, its publish budget); the usage headers on each
+    response feed back into that budget. graph_quota.QuotaExceededError is
+    raised when the wait would be longer than GRAPH_QUOTA_MAX_WAIT.
+    """
+    breakers = breakers_for(platform, account)
+    attempt = 0
+    while True:
+        # Wait for quota first: a breaker trial must only be taken for a call that is made
+        await graph_quota.acquire(platform, account, publish=publish and attempt == 0)
+        check_breakers(breakers)
+        try:
+            response = await get_graph_client().request(method, path, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+            record_outcome(breakers, success=False)
+            if attempt >= settings.RETRY_MAX_ATTEMPTS:
+                raise
+        except httpx.TransportError:
+            record_outcome(breakers, success=False)
+            if method != "GET" or attempt >= settings.RETRY_MAX_ATTEMPTS:
+                raise
+        else:
+            graph_quota.observe(platform, account, response.headers)
+            payload = _decode(response)
+            scope = _transient_scope(response.status_code, payload)
+            if scope is None:
+                # Permanent errors (bad token, invalid media...) are the caller's problem,
+                # not a sign that the platform is degraded
+                record_outcome(breakers, success=True)
+                return payload
+            # One throttled account must not open the breaker for every tenant
+            record_outcome(breakers[1:] if scope == "account" else breakers, success=False)
+            if attempt >= settings.RETRY_MAX_ATTEMPTS:
+                return payload
+            if publish and not _throttled(response.status_code, payload):
+                return payload
+
+        await asyncio.sleep(retry_delay(attempt))
+        attempt += 1
+
+
+async def graph_get(path: str, params: dict = None, platform: str = "graph", account: str = None) -> dict:
+    return await _request("GET", path, platform, account, params=params)
+
+
+async def graph_post(path: str, data: dict = None, params: dict = None,
+                     platform: str = "graph", account: str = None, publish: bool = False) -> dict:
+    """POST to the Graph API; pass publish=True for calls that put a post live."""
+    return await _request("POST", path, platform, account, publish=publish, data=data, params=params)
+
+
+async def close_graph_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import time
+from cachetools import TTLCache
+from config import settings
+
+# Graph API usage headers, see
+# https://developers.facebook.com/docs/graph-api/overview/rate-limiting
+# X-App-Usage covers the whole app, so it drives the shared AppQuota below;
+# the Page and business use case headers describe the account that was called.
+APP_USAGE_HEADER = "x-app-usage"
+ACCOUNT_USAGE_HEADERS = ("x-page-usage", "x-business-use-case-usage")
+# Longest pause applied to every account as app-wide usage approaches 100%
+APP_USAGE_MAX_PAUSE = 60
+USAGE_FIELDS = ("call_count", "total_cputime", "total_time")
+
+
+class QuotaExceededError(Exception):
+    """The account is out of quota for longer than a caller is willing to wait."""
+
+    def __init__(self, account: str, retry_after: float):
+        super().__init__(f"Graph API quota exhausted for {account}, retry in {int(retry_after)}s")
+        self.account = account
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class AccountQuota:
+    """Call and publish budgets for one Instagram user or Facebook Page."""
+
+    def __init__(self, platform: str):
+        self.calls = TokenBucket(
+            settings.GRAPH_CALL_BURST, settings.GRAPH_CALLS_PER_HOUR / 3600
+        )
+        publishes_per_day = (
+            settings.INSTAGRAM_PUBLISHES_PER_DAY if platform == "instagram"
+            else settings.FACEBOOK_PUBLISHES_PER_DAY
+        )
+        self.publishes = TokenBucket(publishes_per_day, publishes_per_day / 86400)
+        self.blocked_until = 0.0
+        self.usage_pct = 0
+
+    def wait_time(self, publish: bool) -> float:
+        wait = max(self.calls.wait_time(), self.blocked_until - time.monotonic())
+        if publish:
+            wait = max(wait, self.publishes.wait_time())
+        return wait
+
+    def snapshot(self) -> dict:
+        return {
+            "usage_pct": self.usage_pct,
+            "call_tokens": round(self.calls.tokens, 2),
+            "publish_tokens": round(self.publishes.tokens, 2),
+            "blocked_for_seconds": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+        }
+
+
+class AppQuota:
+    """App-wide usage from X-App-Usage, shared by every account."""
+
+    def __init__(self):
+        self.blocked_until = 0.0
+        self.usage_pct = 0
+
+    def wait_time(self) -> float:
+        return self.blocked_until - time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "usage_pct": self.usage_pct,
+            "blocked_for_seconds": round(max(0.0, self.wait_time()), 1),
+        }
+
+
+_app_quota = AppQuota()
+# Re-inserted on each use, so only accounts idle for GRAPH_QUOTA_IDLE_TTL are dropped
+_quotas = TTLCache(maxsize=settings.ACCOUNT_STATE_MAX_ENTRIES, ttl=settings.GRAPH_QUOTA_IDLE_TTL)
+
+
+def _get_quota(platform: str, account: str) -> AccountQuota:
+    key = f"{platform}:{account}"
+    quota = _quotas.get(key)
+    if quota is None:
+        quota = AccountQuota(platform)
+    _quotas[key] = quota
+    return quota
+
+
+async def acquire(platform: str, account: str, publish: bool = False, max_wait: float = None):
+    """
+    Wait for this account's call (and publish) budget, then spend it.
+
+    Raises QuotaExceededError instead of waiting longer than max_wait
+    (GRAPH_QUOTA_MAX_WAIT by default), so callers can reschedule instead.
+    """
+    max_wait = settings.GRAPH_QUOTA_MAX_WAIT if max_wait is None else max_wait
+    quota = _get_quota(platform, account) if account else None
+    while True:
+        wait = _app_quota.wait_time()
+        if quota is not None:
+            wait = max(wait, quota.wait_time(publish))
+        if wait <= 0:
+            break
+        if wait > max_wait:
+            raise QuotaExceededError(f"{platform}:{account}" if account else "app", wait)
+        await asyncio.sleep(wait)
+
+    if quota is not None:
+        quota.calls.take()
+        if publish:
+            quota.publishes.take()
+
+
+def publish_delay(creds: dict) -> float:
+    """Seconds until every account in the tenant's credentials can publish again."""
+    accounts = [("instagram", creds.get("IG_USER_ID")), ("facebook", creds.get("PAGE_ID"))]
+    return max(
+        [_get_quota(platform, account).wait_time(publish=True) for platform, account in accounts if account]
+        + [_app_quota.wait_time(), 0.0]
+    )
+
+
+def _usage_entries(headers, names):
+    for name in names:
+        raw = headers.get(name)
+        if not raw:
+            continue
+        try:
+            usage = json.loads(raw)
+        except ValueError:
+            continue
+        if name == "x-business-use-case-usage":
+            # {"<business id>": [{"type": ..., "call_count": ..., ...}]}
+            for entries in usage.values():
+                yield from entries
+        else:
+            yield usage
+
+
+def _usage_pct(entries) -> int:
+    return max([0] + [entry.get(field) or 0 for entry in entries for field in USAGE_FIELDS])
+
+
+def _observe_app_usage(headers):
+    app_entries = list(_usage_entries(headers, (APP_USAGE_HEADER,)))
+    if not app_entries:
+        return
+    usage_pct = _usage_pct(app_entries)
+    _app_quota.usage_pct = usage_pct
+    if usage_pct >= settings.GRAPH_USAGE_THRESHOLD:
+        # Spread the pause over the headroom left: short near the threshold,
+        # APP_USAGE_MAX_PAUSE once the app is at 100%
+        headroom = max(1, 100 - settings.GRAPH_USAGE_THRESHOLD)
+        pause = min(1.0, (usage_pct - settings.GRAPH_USAGE_THRESHOLD) / headroom) * APP_USAGE_MAX_PAUSE
+        _app_quota.blocked_until = max(_app_quota.blocked_until, time.monotonic() + pause)
+
+
+def observe(platform: str, account: str, headers):
+    """Adjust the app-wide and the account's budget from the usage headers of a Graph response."""
+    _observe_app_usage(headers)
+    if not account:
+        return
+    quota = _get_quota(platform, account)
+    usage_pct = 0
+    regain_seconds = 0
+    for entry in _usage_entries(headers, ACCOUNT_USAGE_HEADERS):
+        usage_pct = max([usage_pct] + [entry.get(field) or 0 for field in USAGE_FIELDS])
+        regain_seconds = max(regain_seconds, (entry.get("estimated_time_to_regain_access") or 0) * 60)
+    quota.usage_pct = usage_pct
+
+    now = time.monotonic()
+    if regain_seconds:
+        quota.blocked_until = max(quota.blocked_until, now + regain_seconds)
+    elif usage_pct >= settings.GRAPH_USAGE_THRESHOLD:
+        # Near the limit: drain the burst allowance so calls fall back to the
+        # steady refill rate, and stop entirely at 100%
+        quota.calls.tokens = min(quota.calls.tokens, 0)
+        if usage_pct >= 100:
+            quota.blocked_until = max(quota.blocked_until, now + 60)
+
+
+def get_quota_states() -> dict:
+    return {
+        "app": _app_quota.snapshot(),
+        "accounts": {key: quota.snapshot() for key, quota in list(_quotas.items())},
+    }
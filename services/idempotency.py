@@ -0,0 +1,100 @@
+import hashlib
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+from config import settings
+from database.mongo import get_collection
+
+# One document per (scope, Idempotency-Key). A TTL index on created_at drops
+# them after IDEMPOTENCY_TTL_SECONDS.
+idempotency_collection = get_collection("idempotency_keys")
+
+KEY_IN_PROGRESS = "in_progress"
+KEY_COMPLETED = "completed"
+
+
+def request_fingerprint(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode() if not isinstance(part, bytes) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+async def _acquire(key_id: str, fingerprint: str):
+    """Take the key for this request. Returns None on success, else the existing record."""
+    while True:
+        now = datetime.utcnow()
+        locked_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        try:
+            await idempotency_collection.insert_one({
+                "_id": key_id,
+                "status": KEY_IN_PROGRESS,
+                "fingerprint": fingerprint,
+                "locked_until": locked_until,
+                "created_at": now,
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        # Take over a key whose original request died without finishing
+        taken_over = await idempotency_collection.update_one(
+            {"_id": key_id, "status": KEY_IN_PROGRESS, "fingerprint": fingerprint, "locked_until": {"$lt": now}},
+            {"$set": {"locked_until": locked_until}},
+        )
+        if taken_over.modified_count:
+            return None
+        existing = await idempotency_collection.find_one({"_id": key_id})
+        if existing is not None:
+            return existing
+        # Released (failed handler) or expired since the insert failed: try again
+
+
+async def run_idempotent(idempotency_key, scope: str, fingerprint, handler, status_code: int = 200):
+    """
+    Run handler() at most once per Idempotency-Key.
+
+    fingerprint is a callable returning request_fingerprint(...) of the
+    request; it is only called when a key was sent.
+
+    A retry with the same key gets the stored response back (with an
+    Idempotent-Replayed header), or a 409 while the first request is still
+    running. Reusing a key for a different request is a 422. If the handler
+    fails, the key is released so the client can retry.
+    """
+    if not idempotency_key:
+        return await handler()
+
+    key_id = f"{scope}:{idempotency_key}"
+    fingerprint = fingerprint()
+    existing = await _acquire(key_id, fingerprint)
+    if existing is not None:
+        if existing["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was already used for a different request"
+            )
+        if existing["status"] == KEY_COMPLETED:
+            return JSONResponse(
+                content=existing["response"],
+                status_code=existing["status_code"],
+                headers={"Idempotent-Replayed": "true"},
+            )
+        raise HTTPException(
+            status_code=409, detail="A request with this Idempotency-Key is still in progress"
+        )
+
+    try:
+        response = await handler()
+    except Exception:
+        await idempotency_collection.delete_one({"_id": key_id})
+        raise
+
+    stored = jsonable_encoder(response)
+    await idempotency_collection.update_one(
+        {"_id": key_id},
+        {"$set": {"status": KEY_COMPLETED, "status_code": status_code, "response": stored}},
+    )
+    return stored
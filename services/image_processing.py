@@ -0,0 +1,125 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from PIL import Image, ImageOps
+from config import settings
+from services.metrics import track_stage
+
+# Decoding and resampling are CPU bound, so they run in worker processes rather
+# than threads. "spawn" keeps the workers from inheriting the event loop and
+# the Mongo/HTTP client threads of the API process.
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PREPROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _fit_aspect_ratio(image: Image.Image, min_ratio: float, max_ratio: float) -> Image.Image:
+    """Pad the image with white bars until width / height is within the bounds."""
+    width, height = image.size
+    ratio = width / height
+    if ratio < min_ratio:
+        width = round(height * min_ratio)
+    elif ratio > max_ratio:
+        height = round(width / max_ratio)
+    else:
+        return image
+
+    canvas = Image.new("RGB", (width, height), "white")
+    canvas.paste(image, ((width - image.width) // 2, (height - image.height) // 2))
+    return canvas
+
+
+def prepare_image_bytes(data: bytes, max_width: int, min_ratio: float, max_ratio: float,
+                        quality: int) -> bytes:
+    """
+    Decode, auto-orient, pad to the aspect ratio bounds, shrink to max_width
+    (and the matching height) and re-encode as an optimized progressive JPEG.
+
+    An already-compliant JPEG is returned as is when re-encoding would not
+    make it smaller.
+    """
+    with Image.open(BytesIO(data)) as source:
+        source_format = source.format
+        image = ImageOps.exif_transpose(source)
+        original_size = image.size
+
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white; JPEG has no alpha channel
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        image = _fit_aspect_ratio(image, min_ratio, max_ratio)
+        image.thumbnail((max_width, round(max_width / min_ratio)), Image.LANCZOS)
+
+        output = BytesIO()
+        image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+
+    prepared = output.getvalue()
+    unchanged = source_format == "JPEG" and image.size == original_size
+    if unchanged and len(prepared) >= len(data):
+        return data
+    return prepared
+
+
+def preprocess_settings() -> tuple:
+    """The settings that decide what prepare_image produces, None when it is off."""
+    if not settings.IMAGE_PREPROCESS_ENABLED:
+        return None
+    return (
+        settings.IMAGE_MAX_WIDTH,
+        settings.IMAGE_MIN_ASPECT_RATIO,
+        settings.IMAGE_MAX_ASPECT_RATIO,
+        settings.IMAGE_JPEG_QUALITY,
+    )
+
+
+async def prepare_image(data: bytes) -> bytes:
+    """
+    Run prepare_image_bytes in the process pool.
+
+    Anything Pillow cannot handle is uploaded as it came in, so preprocessing
+    never makes a post fail that would have gone through before.
+    """
+    if not settings.IMAGE_PREPROCESS_ENABLED:
+        return data
+    loop = asyncio.get_running_loop()
+    try:
+        with track_stage("image_preprocess"):
+            return await loop.run_in_executor(
+                _get_executor(),
+                prepare_image_bytes,
+                data,
+                settings.IMAGE_MAX_WIDTH,
+                settings.IMAGE_MIN_ASPECT_RATIO,
+                settings.IMAGE_MAX_ASPECT_RATIO,
+                settings.IMAGE_JPEG_QUALITY,
+            )
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        shutdown_image_processing()
+        print(f"Image preprocessing pool broke, uploading the original: {e}")
+        return data
+    except Exception as e:
+        print(f"Image preprocessing failed, uploading the original: {e}")
+        return data
+
+
+def shutdown_image_processing():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from io import BytesIO
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+import cloudinary.exceptions
+from fastapi import HTTPException, status
+from config import settings
+from database.mongo import get_collection
+from services.image_processing import prepare_image, preprocess_settings
+from services.metrics import track_stage
+from services.resilience import breakers_for, check_breakers, record_outcome, retry_delay
+
+cloudinary.config(
+    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+    api_key=settings.CLOUDINARY_API_KEY,
+    api_secret=settings.CLOUDINARY_API_SECRET
+)
+
+# The Cloudinary SDK is blocking, so uploads run on a dedicated pool that is
+# never shared with other work. The semaphore caps concurrent uploads per
+# worker process; callers over the cap wait on the event loop, not in a thread.
+_upload_executor = ThreadPoolExecutor(
+    max_workers=settings.CLOUDINARY_MAX_CONCURRENT_UPLOADS, thread_name_prefix="cloudinary"
+)
+_upload_slots = asyncio.Semaphore(settings.CLOUDINARY_MAX_CONCURRENT_UPLOADS)
+
+# Uploaded assets keyed by "<resource_type>:<sha256 of the content>:<variant>",
+# where the variant covers the upload options and image preprocessing settings.
+# Entries expire after MEDIA_INDEX_TTL_SECONDS (TTL index on created_at).
+media_index_collection = get_collection("media_index")
+HASH_CHUNK_SIZE = 1024 * 1024
+# Upload options that only label the asset, so they do not make a new variant
+UNKEYED_OPTIONS = ("filename",)
+
+
+# Rate limiting, Cloudinary 5xx, and network errors (raised as the base Error)
+TRANSIENT_UPLOAD_ERRORS = (cloudinary.exceptions.RateLimited, cloudinary.exceptions.GeneralError)
+
+
+async def _run_upload(upload_func, file, options: dict, max_retries: int = settings.RETRY_MAX_ATTEMPTS):
+    options.setdefault("timeout", settings.CLOUDINARY_UPLOAD_TIMEOUT)
+    breakers = breakers_for("cloudinary")
+    attempt = 0
+    while True:
+        check_breakers(breakers)
+        try:
+            async with _upload_slots:
+                loop = asyncio.get_running_loop()
+                with track_stage("cloudinary_upload"):
+                    result = await loop.run_in_executor(_upload_executor, partial(upload_func, file, **options))
+        except cloudinary.exceptions.Error as e:
+            transient = isinstance(e, TRANSIENT_UPLOAD_ERRORS) or type(e) is cloudinary.exceptions.Error
+            record_outcome(breakers, success=not transient)
+            if not transient or attempt >= max_retries:
+                raise
+            if hasattr(file, "seek"):
+                file.seek(0)
+        except Exception:
+            record_outcome(breakers, success=False)
+            raise
+        else:
+            record_outcome(breakers, success=True)
+            return result
+
+        await asyncio.sleep(retry_delay(attempt))
+        attempt += 1
+
+
+async def upload_media(file, **options):
+    """Upload a file object, path or URL to Cloudinary without blocking the event loop."""
+    return await _run_upload(cloudinary.uploader.upload, file, options)
+
+
+async def upload_media_stream(file, resource_type: str, **options):
+    """
+    Upload a seekable file object (e.g. a spooled multipart upload) in chunks.
+
+    Only one chunk of CLOUDINARY_UPLOAD_CHUNK_SIZE bytes is held in memory at a
+    time, whatever the size of the media. The file is closed when done.
+    """
+    options.setdefault("chunk_size", settings.CLOUDINARY_UPLOAD_CHUNK_SIZE)
+    # upload_large closes the file when it is done, so a failed upload cannot be replayed
+    return await _run_upload(
+        cloudinary.uploader.upload_large, file, {"resource_type": resource_type, **options}, max_retries=0
+    )
+
+
+def _source_size(source) -> int:
+    if isinstance(source, bytes):
+        return len(source)
+    source.seek(0, 2)
+    size = source.tell()
+    source.seek(0)
+    return size
+
+
+def _content_hash(source) -> str:
+    """SHA-256 of bytes or of a seekable binary file, read in chunks and rewound."""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    source.seek(0)
+    for chunk in iter(partial(source.read, HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+async def content_hash(source) -> str:
+    """SHA-256 hex digest of bytes or a seekable file, computed off the event loop."""
+    return await asyncio.to_thread(_content_hash, source)
+
+
+def _index_key(resource_type: str, digest: str, options: dict) -> str:
+    variant = sorted((k, repr(v)) for k, v in options.items() if k not in UNKEYED_OPTIONS)
+    if resource_type == "image":
+        variant.append(("preprocess", repr(preprocess_settings())))
+    variant_hash = hashlib.sha256(repr(variant).encode()).hexdigest()[:16]
+    return f"{resource_type}:{digest}:{variant_hash}"
+
+
+async def store_media(source, resource_type: str = "image", digest: str = None, **options):
+    """
+    Upload bytes or a seekable file, reusing an earlier upload of identical content.
+
+    A hit in media_index skips Cloudinary entirely and returns the stored
+    upload response with "deduplicated": True. Video files are sent with the
+    chunked uploader, so their size never matters for memory.
+
+    Images are resized, padded and re-encoded for Instagram/Facebook first
+    (see services.image_processing), which needs the whole image in memory.
+    Images over IMAGE_MAX_BYTES are therefore refused with 413 before anything
+    is read. The index is keyed by the original content, so a repeated image
+    skips the preprocessing as well; changing the upload options or the
+    IMAGE_* preprocessing settings starts a new entry. Pass digest when the caller already
+    has content_hash(source), so the content is not read twice.
+    """
+    if resource_type == "image":
+        size = await asyncio.to_thread(_source_size, source)
+        if size > settings.IMAGE_MAX_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Images may be at most {settings.IMAGE_MAX_BYTES // (1024 * 1024)} MB",
+            )
+
+    if digest is None:
+        digest = await content_hash(source)
+    key = _index_key(resource_type, digest, options)
+
+    indexed = await media_index_collection.find_one({"_id": key})
+    if indexed:
+        return {**indexed["cloudinary_response"], "deduplicated": True}
+
+    if resource_type == "image":
+        if not isinstance(source, bytes):
+            # Bounded by the IMAGE_MAX_BYTES check above
+            source = await asyncio.to_thread(source.read)
+        source = await prepare_image(source)
+
+    if isinstance(source, bytes):
+        result = await upload_media(BytesIO(source), resource_type=resource_type, **options)
+    else:
+        result = await upload_media_stream(source, resource_type, **options)
+
+    if result.get("secure_url"):
+        # $setOnInsert keeps the first upload if two identical ones raced
+        await media_index_collection.update_one(
+            {"_id": key},
+            {"$setOnInsert": {
+                "public_id": result.get("public_id"),
+                "secure_url": result["secure_url"],
+                "cloudinary_response": result,
+                "created_at": datetime.utcnow(),
+            }},
+            upsert=True,
+        )
+    return result
+
+
+# Formats media is delivered in for publishing. Cloudinary converts on
+# delivery, and Instagram only accepts JPEG images, so the client's format is
+# never used.
+DELIVERY_FORMATS = {"image": "jpg", "video": "mp4"}
+
+
+def user_upload_folder(user_id: str, resource_type: str) -> str:
+    return f"social_uploads/{user_id}/{resource_type}"
+
+
+def create_upload_signature(user_id: str, resource_type: str) -> dict:
+    """
+    Signed parameters that let a client upload straight to Cloudinary.
+
+    Uploads are pinned to a folder for the user and resource type, both
+    covered by the signature. A later publish request can only reference
+    assets this user uploaded, and only as the type they were signed for.
+    """
+    timestamp = int(time.time())
+    params = {"timestamp": timestamp, "folder": user_upload_folder(user_id, resource_type)}
+    return {
+        "upload_url": cloudinary.utils.cloudinary_api_url("upload", resource_type=resource_type),
+        "api_key": settings.CLOUDINARY_API_KEY,
+        "cloud_name": settings.CLOUDINARY_CLOUD_NAME,
+        "timestamp": timestamp,
+        "folder": params["folder"],
+        "signature": cloudinary.utils.api_sign_request(params, settings.CLOUDINARY_API_SECRET),
+        "expires_at": timestamp + settings.CLOUDINARY_SIGNATURE_TTL,
+    }
+
+
+def verify_direct_upload(user_id: str, resource_type: str, public_id: str, version, signature: str) -> bool:
+    """
+    Check the signature Cloudinary returned to the client for its direct upload.
+
+    The response signature covers public_id and version. The public_id must
+    be in the folder signed for this user and resource type. The version is
+    the upload time, and must be within CLOUDINARY_SIGNATURE_TTL.
+    """
+    if not public_id.startswith(user_upload_folder(user_id, resource_type) + "/"):
+        return False
+    try:
+        uploaded_at = int(version)
+    except (TypeError, ValueError):
+        return False
+    if abs(time.time() - uploaded_at) > settings.CLOUDINARY_SIGNATURE_TTL:
+        return False
+    return cloudinary.utils.verify_api_response_signature(public_id, version, signature)
+
+
+def build_media_url(public_id: str, resource_type: str, version) -> str:
+    url, _ = cloudinary.utils.cloudinary_url(
+        public_id, resource_type=resource_type, version=version,
+        format=DELIVERY_FORMATS[resource_type], secure=True,
+    )
+    return url
+
+
+def shutdown_media_storage():
+    _upload_executor.shutdown(wait=False)
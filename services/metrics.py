@@ -0,0 +1,135 @@
+"""
+Prometheus metrics for the API, exposed at /metrics.
+
+With a single worker, /metrics serves the default registry. When running
+several uvicorn/gunicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by them (before the app starts); every worker then writes its
+samples there and /metrics aggregates all of them on each scrape.
+"""
+import asyncio
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from pymongo import monitoring
+from starlette.routing import Match
+from config import settings
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+# Uploads and publishing take seconds, not milliseconds
+STAGE_LATENCY = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Time spent in each stage of the posting pipeline",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt hash/verify time including the wait for a pool worker",
+    ["operation"],
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Hash jobs rejected because the pool queue was full",
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency as reported by the driver",
+    ["command", "outcome"],
+)
+EVENT_LOOP_LAG = Gauge(
+    "event_loop_lag_seconds",
+    "How late the last event loop lag probe woke up",
+    # One series per live worker (labelled by pid) when aggregating across processes
+    multiprocess_mode="liveall",
+)
+EVENT_LOOP_LAG_HISTOGRAM = Histogram(
+    "event_loop_lag_distribution_seconds",
+    "Distribution of event loop lag probe delays",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+def _multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render_metrics():
+    """(body, content type) for /metrics, aggregated across workers when multiprocess mode is on."""
+    if _multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_exit():
+    """Drop this worker's live gauges from the multiprocess aggregate."""
+    if _multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def track_stage(stage: str):
+    """Context manager timing one pipeline stage: `with track_stage("decode"): ...`"""
+    return STAGE_LATENCY.labels(stage=stage).time()
+
+
+def route_template(request) -> str:
+    """The path template of the matched route, e.g. /api/jobs/{job_id}."""
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    # Never label by the raw path: unknown URLs would create unbounded series
+    return "unmatched"
+
+
+async def record_request_metrics(request, call_next):
+    """HTTP middleware recording REQUEST_LATENCY for every request."""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=route_template(request),
+            status=str(status_code),
+        ).observe(time.perf_counter() - start)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feeds MONGO_COMMAND_LATENCY from pymongo's command monitoring events."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(command=event.command_name, outcome="success").observe(
+            event.duration_micros / 1e6
+        )
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(command=event.command_name, outcome="failure").observe(
+            event.duration_micros / 1e6
+        )
+
+
+async def monitor_event_loop_lag():
+    """Sleep for a fixed interval and record how much later than asked the loop woke us."""
+    interval = settings.EVENT_LOOP_LAG_INTERVAL
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HISTOGRAM.observe(lag)
@@ -0,0 +1,85 @@
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import settings
+from database.mongo import get_collection
+
+otp_collection = get_collection("otp_codes")
+
+# At most one live code per (email, purpose); issuing a new one replaces it.
+# Only an HMAC of the code is stored, and the TTL index on expires_at lets
+# MongoDB remove codes that were never used.
+OTP_PASSWORD_RESET = "password_reset"
+OTP_EMAIL_VERIFICATION = "email_verification"
+OTP_PURPOSES = (OTP_PASSWORD_RESET, OTP_EMAIL_VERIFICATION)
+
+OTP_VALID = "valid"
+OTP_INVALID = "invalid"
+OTP_MISSING = "missing"
+OTP_LOCKED = "locked"
+
+
+def _hash_code(email: str, purpose: str, code: str) -> str:
+    message = f"{email}:{purpose}:{code}".encode()
+    return hmac.new(settings.OTP_HMAC_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+async def issue_otp(email: str, purpose: str) -> str:
+    """Create a fresh 6 digit code for email/purpose and return it in plain text."""
+    code = str(secrets.randbelow(900000) + 100000)
+    now = datetime.utcnow()
+    selector = {"email": email, "purpose": purpose}
+    doc = {
+        "email": email,
+        "purpose": purpose,
+        "code_hash": _hash_code(email, purpose, code),
+        "attempts": 0,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=settings.OTP_TTL_SECONDS),
+    }
+    try:
+        await otp_collection.replace_one(selector, doc, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent request inserted the document first; it exists now,
+        # so replacing it again no longer inserts
+        await otp_collection.replace_one(selector, doc, upsert=True)
+    return code
+
+
+async def check_otp(email: str, purpose: str, code: str) -> str:
+    """
+    Check a code and consume it when it matches.
+
+    Every check counts as an attempt, taken atomically before comparing, so
+    concurrent guesses cannot get past OTP_MAX_ATTEMPTS. Returns OTP_VALID,
+    OTP_INVALID, OTP_MISSING (none issued, or expired) or OTP_LOCKED.
+    """
+    now = datetime.utcnow()
+    otp = await otp_collection.find_one_and_update(
+        {"email": email, "purpose": purpose, "expires_at": {"$gt": now}},
+        {"$inc": {"attempts": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if otp is None:
+        return OTP_MISSING
+    if otp["attempts"] > settings.OTP_MAX_ATTEMPTS:
+        return OTP_LOCKED
+    if not hmac.compare_digest(otp["code_hash"], _hash_code(email, purpose, code)):
+        return OTP_INVALID
+
+    await otp_collection.delete_one({"_id": otp["_id"]})
+    return OTP_VALID
+
+
+async def discard_otp(email: str, purpose: str, code: str):
+    """Remove this code, unless a newer one has replaced it already."""
+    await otp_collection.delete_one(
+        {"email": email, "purpose": purpose, "code_hash": _hash_code(email, purpose, code)}
+    )
+
+
+async def discard_otps(email: str):
+    await otp_collection.delete_many({"email": email})
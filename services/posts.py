@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from database.mongo import get_collection
+from services.metrics import track_stage
+
+social_collection = get_collection("social")
+# Raw Cloudinary/Graph API responses, keyed by the post's _id. They are only
+# read when someone asks for them, so they stay out of the hot working set.
+social_raw_collection = get_collection("social_raw")
+
+POST_PUBLISHED = "published"
+POST_PARTIAL = "partial"
+POST_FAILED = "failed"
+POST_SKIPPED = "skipped"
+
+
+def _platform_result(response):
+    """(status, post_id) for one platform's Graph API response."""
+    if response is None:
+        return POST_SKIPPED, None
+    if "error" in response or "id" not in response:
+        return POST_FAILED, None
+    # Facebook photo posts return both the photo id and the feed post id
+    return POST_PUBLISHED, response.get("post_id") or response["id"]
+
+
+def build_compact_post(user_obj_id: ObjectId, caption: str, cloudinary_response: dict,
+                       insta_response, fb_response, uploaded_at: datetime = None) -> dict:
+    instagram_status, instagram_post_id = _platform_result(insta_response)
+    facebook_status, facebook_post_id = _platform_result(fb_response)
+
+    attempted = [s for s in (instagram_status, facebook_status) if s != POST_SKIPPED]
+    if not attempted:
+        status = POST_SKIPPED
+    elif all(s == POST_PUBLISHED for s in attempted):
+        status = POST_PUBLISHED
+    elif any(s == POST_PUBLISHED for s in attempted):
+        status = POST_PARTIAL
+    else:
+        status = POST_FAILED
+
+    return {
+        "user_id": user_obj_id,
+        "caption": caption,
+        "media_type": (cloudinary_response or {}).get("resource_type", "image"),
+        "media_url": (cloudinary_response or {}).get("secure_url"),
+        "public_id": (cloudinary_response or {}).get("public_id"),
+        "instagram_post_id": instagram_post_id,
+        "instagram_status": instagram_status,
+        "facebook_post_id": facebook_post_id,
+        "facebook_status": facebook_status,
+        "status": status,
+        "uploaded_at": uploaded_at or datetime.utcnow(),
+    }
+
+
+def build_raw_record(post_id: ObjectId, user_obj_id: ObjectId, cloudinary_response,
+                     insta_response, fb_response) -> dict:
+    return {
+        "_id": post_id,
+        "user_id": user_obj_id,
+        "cloudinary_response": cloudinary_response,
+        "instagram_response": insta_response,
+        "facebook_response": fb_response,
+        "archived_at": datetime.utcnow(),
+    }
+
+
+async def record_post(user_obj_id: ObjectId, caption: str, cloudinary_response: dict,
+                      insta_response, fb_response, post_id: ObjectId = None) -> dict:
+    """
+    Store a compact post document plus its raw responses in the archive.
+
+    Both writes run concurrently. Returns the compact post with string ids,
+    ready to send back to the client.
+
+    Background workers pass a post_id derived from their job, so recording
+    the same job again after a crash overwrites the post instead of adding a
+    duplicate.
+    """
+    if post_id is None:
+        post_id = ObjectId()
+    post = build_compact_post(user_obj_id, caption, cloudinary_response, insta_response, fb_response)
+    post["_id"] = post_id
+    raw = build_raw_record(post_id, user_obj_id, cloudinary_response, insta_response, fb_response)
+
+    with track_stage("mongo_insert"):
+        await asyncio.gather(
+            social_collection.replace_one({"_id": post_id}, post, upsert=True),
+            social_raw_collection.replace_one({"_id": post_id}, raw, upsert=True),
+        )
+
+    post["_id"] = str(post_id)
+    post["user_id"] = str(user_obj_id)
+    return post
+
+
+async def get_raw_responses(post_ids: list) -> dict:
+    """Archived raw responses by post _id (as ObjectId)."""
+    if not post_ids:
+        return {}
+    raw_docs = await social_raw_collection.find(
+        {"_id": {"$in": post_ids}}, {"user_id": 0, "archived_at": 0}
+    ).to_list(length=len(post_ids))
+    return {doc.pop("_id"): doc for doc in raw_docs}
+
+
+async def get_raw_record(post_id: ObjectId, user_obj_id: ObjectId):
+    return await social_raw_collection.find_one(
+        {"_id": post_id, "user_id": user_obj_id}, {"_id": 0, "user_id": 0}
+    )
@@ -0,0 +1,105 @@
+import asyncio
+from services.graph_client import graph_get, graph_post
+from services.metrics import track_stage
+
+
+def get_platform_credentials(tenant: dict) -> dict:
+    insta_creds = tenant.get("insta_credentials") or {}
+    fb_creds = tenant.get("facebook_credentials") or {}
+    return {
+        "IG_USER_ID": insta_creds.get("IG_USER_ID"),
+        "ACCESS_TOKENS": insta_creds.get("ACCESS_TOKENS"),
+        "PAGE_ID": fb_creds.get("PAGE_ID"),
+        "FACEBOOK_ACCESS": fb_creds.get("FACEBOOK_ACCESS"),
+    }
+
+
+async def publish_instagram_image(ig_user_id: str, access_token: str, image_url: str, caption: str) -> dict:
+    with track_stage("instagram_container"):
+        container_res = await graph_post(f"{ig_user_id}/media", data={
+            "image_url": image_url,
+            "caption": caption,
+            "access_token": access_token
+        }, platform="instagram", account=ig_user_id)
+    if "id" not in container_res:
+        return {"error": f"Instagram media creation failed: {container_res}"}
+
+    with track_stage("instagram_publish"):
+        return await graph_post(f"{ig_user_id}/media_publish", data={
+            "creation_id": container_res["id"],
+            "access_token": access_token
+        }, platform="instagram", account=ig_user_id, publish=True)
+
+
+async def publish_facebook_photo(page_id: str, access_token: str, image_url: str, caption: str) -> dict:
+    with track_stage("facebook_post"):
+        return await graph_post(f"{page_id}/photos", data={
+            "url": image_url,
+            "caption": caption,
+            "access_token": access_token
+        }, platform="facebook", account=page_id, publish=True)
+
+
+async def publish_image(creds: dict, image_url: str, caption: str):
+    """
+    Post an already-hosted image to every platform the tenant has credentials for.
+
+    Instagram and Facebook run as concurrent tasks; a failure on one platform is
+    captured as an {"error": ...} response and never cancels the other.
+    Returns (instagram_response, facebook_response), None for skipped platforms.
+    """
+    tasks = {}
+    if creds["IG_USER_ID"] and creds["ACCESS_TOKENS"]:
+        tasks["instagram"] = publish_instagram_image(
+            creds["IG_USER_ID"], creds["ACCESS_TOKENS"], image_url, caption
+        )
+    if creds["PAGE_ID"] and creds["FACEBOOK_ACCESS"]:
+        tasks["facebook"] = publish_facebook_photo(
+            creds["PAGE_ID"], creds["FACEBOOK_ACCESS"], image_url, caption
+        )
+
+    responses = {"instagram": None, "facebook": None}
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    for platform, result in zip(tasks, results):
+        if isinstance(result, BaseException):
+            result = {"error": f"{platform.capitalize()} publish failed: {result}"}
+        responses[platform] = result
+
+    return responses["instagram"], responses["facebook"]
+
+
+async def create_instagram_reel_container(ig_user_id: str, access_token: str, video_url: str, caption: str) -> dict:
+    with track_stage("instagram_container"):
+        return await graph_post(f"{ig_user_id}/media", params={
+            "media_type": "REELS",
+            "video_url": video_url,
+            "caption": caption,
+            "access_token": access_token
+        }, platform="instagram", account=ig_user_id)
+
+
+async def get_instagram_container_status(ig_user_id: str, creation_id: str, access_token: str) -> str:
+    status_res = await graph_get(
+        creation_id,
+        params={"fields": "status_code", "access_token": access_token},
+        platform="instagram",
+        account=ig_user_id,
+    )
+    return status_res.get("status_code")
+
+
+async def publish_instagram_container(ig_user_id: str, access_token: str, creation_id: str) -> dict:
+    with track_stage("instagram_publish"):
+        return await graph_post(f"{ig_user_id}/media_publish", params={
+            "creation_id": creation_id,
+            "access_token": access_token
+        }, platform="instagram", account=ig_user_id, publish=True)
+
+
+async def publish_facebook_video(page_id: str, access_token: str, video_url: str, caption: str) -> dict:
+    with track_stage("facebook_post"):
+        return await graph_post(f"{page_id}/videos", data={
+            "file_url": video_url,
+            "description": caption,
+            "access_token": access_token
+        }, platform="facebook", account=page_id, publish=True)
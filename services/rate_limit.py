@@ -0,0 +1,152 @@
+import asyncio
+import math
+import time
+from collections import deque
+from cachetools import TTLCache
+from datetime import datetime, timedelta
+from fastapi import HTTPException, Request, status
+from pymongo import ReturnDocument
+from config import settings
+from database.mongo import get_collection
+
+rate_limits_collection = get_collection("rate_limits")
+
+
+def _parse_limit(value: str):
+    requests, seconds = value.split("/")
+    return int(requests), int(seconds)
+
+
+# (limit per client IP, limit per email) for each protected endpoint
+RULES = {
+    "signin": (_parse_limit(settings.RATE_LIMIT_SIGNIN_IP), _parse_limit(settings.RATE_LIMIT_SIGNIN_EMAIL)),
+    "signup": (_parse_limit(settings.RATE_LIMIT_SIGNUP_IP), _parse_limit(settings.RATE_LIMIT_SIGNUP_EMAIL)),
+    "forgot_pass": (
+        _parse_limit(settings.RATE_LIMIT_FORGOT_PASS_IP), _parse_limit(settings.RATE_LIMIT_FORGOT_PASS_EMAIL)
+    ),
+    "verify_otp": (
+        _parse_limit(settings.RATE_LIMIT_VERIFY_OTP_IP), _parse_limit(settings.RATE_LIMIT_VERIFY_OTP_EMAIL)
+    ),
+}
+
+class MemoryStore:
+    """
+    Exact sliding window: a deque of hit times per key, in this worker process only.
+
+    Keys live in one bounded TTLCache per window length and are re-inserted
+    on every hit, so a key expires one window after its last hit and expiry
+    costs nothing for keys that are still active.
+    """
+
+    def __init__(self):
+        self._hits = {}
+
+    def _cache(self, window: int) -> TTLCache:
+        cache = self._hits.get(window)
+        if cache is None:
+            cache = self._hits[window] = TTLCache(
+                maxsize=settings.RATE_LIMIT_MEMORY_MAX_KEYS, ttl=window
+            )
+        return cache
+
+    async def hit(self, key: str, limit: int, window: int) -> float:
+        """Record a hit unless over the limit; returns seconds to wait, 0 if allowed."""
+        now = time.monotonic()
+        cache = self._cache(window)
+        hits = cache.get(key)
+        if hits is None:
+            hits = deque()
+        cache[key] = hits
+        while hits and now - hits[0] >= window:
+            hits.popleft()
+        if len(hits) >= limit:
+            return window - (now - hits[0])
+        hits.append(now)
+        return 0.0
+
+
+class MongoStore:
+    """
+    Sliding window shared by every worker, approximated from two fixed windows.
+
+    The previous window's count is weighted by how much of it still overlaps
+    the sliding window. Counter documents expire through a TTL index on
+    expires_at. Rejected requests are counted too, so a client that keeps
+    hammering stays blocked.
+    """
+
+    async def hit(self, key: str, limit: int, window: int) -> float:
+        now = time.time()
+        current = int(now // window)
+        elapsed = now - current * window
+        counter, previous = await asyncio.gather(
+            rate_limits_collection.find_one_and_update(
+                {"_id": f"{key}:{window}:{current}"},
+                {
+                    "$inc": {"count": 1},
+                    "$setOnInsert": {
+                        "expires_at": datetime.utcfromtimestamp((current + 2) * window),
+                    },
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            ),
+            rate_limits_collection.find_one({"_id": f"{key}:{window}:{current - 1}"}),
+        )
+        previous_count = previous["count"] if previous else 0
+        weighted = previous_count * (1 - elapsed / window) + counter["count"]
+        if weighted <= limit:
+            return 0.0
+        if counter["count"] > limit:
+            return window - elapsed
+        # Over only because of the previous window: wait until enough of it has slid out
+        excess = weighted - limit
+        return min(window - elapsed, excess / previous_count * window)
+
+
+_memory_store = MemoryStore()
+_mongo_store = MongoStore()
+
+
+def client_ip(request: Request) -> str:
+    hops = settings.RATE_LIMIT_TRUSTED_PROXY_HOPS
+    if hops > 0:
+        # Entries left of the ones our proxies appended are whatever the client sent
+        forwarded = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+        if forwarded:
+            return forwarded[-min(hops, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+
+async def _hit(key: str, limit: int, window: int) -> float:
+    if settings.RATE_LIMIT_BACKEND == "mongo":
+        try:
+            return await _mongo_store.hit(key, limit, window)
+        except Exception as e:
+            # Keep limiting per worker rather than failing open while Mongo is unreachable
+            print(f"Rate limit store unavailable, using in-memory limits: {e}")
+    return await _memory_store.hit(key, limit, window)
+
+
+async def enforce_rate_limit(request: Request, endpoint: str, email: str = None):
+    """
+    Reject the request with 429 and a Retry-After header when the client IP
+    or the email it targets is over the endpoint's limit.
+
+    Call this first thing in the handler, before any bcrypt, SMTP or database work.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    ip_limit, email_limit = RULES[endpoint]
+    checks = [(f"{endpoint}:ip:{client_ip(request)}", *ip_limit)]
+    if email:
+        checks.append((f"{endpoint}:email:{email.strip().lower()}", *email_limit))
+
+    for key, limit, window in checks:
+        retry_after = await _hit(key, limit, window)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
@@ -0,0 +1,127 @@
+import random
+import time
+from cachetools import TTLCache
+from config import settings
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold failures in a row the breaker opens and calls fail
+    fast. Once reset_timeout has passed, one trial call is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    def can_attempt(self) -> bool:
+        """Whether allow() would let a call through; changes no state."""
+        if self.state == BREAKER_CLOSED:
+            return True
+        # Open, or half-open with a trial that never reported back: a new trial is due
+        return time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def allow(self) -> bool:
+        if not self.can_attempt():
+            self.total_rejected += 1
+            return False
+        if self.state != BREAKER_CLOSED:
+            self.state = BREAKER_HALF_OPEN
+            self.opened_at = time.monotonic()
+        return True
+
+    def record_success(self):
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.total_failures += 1
+        if self.state == BREAKER_HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = BREAKER_OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        retry_in = None
+        if self.state != BREAKER_CLOSED:
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+            "retry_in_seconds": retry_in,
+        }
+
+
+# One breaker per platform and per "platform:account". Each use re-inserts the
+# breaker, so only accounts idle for BREAKER_IDLE_TTL are dropped.
+_breakers = TTLCache(maxsize=settings.ACCOUNT_STATE_MAX_ENTRIES, ttl=settings.BREAKER_IDLE_TTL)
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name, settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_SECONDS)
+    _breakers[name] = breaker
+    return breaker
+
+
+def breakers_for(platform: str, account: str = None) -> list:
+    """The platform-wide breaker plus, when known, the one for a single account."""
+    breakers = [get_breaker(platform)]
+    if account:
+        breakers.append(get_breaker(f"{platform}:{account}"))
+    return breakers
+
+
+def check_breakers(breakers: list):
+    """
+    Let a call through only if every breaker allows it.
+
+    All breakers are checked before any of them changes state, so a half-open
+    trial is never handed out for a call that another breaker then rejects.
+    Callers must make the call right after this and record its outcome.
+    """
+    for breaker in breakers:
+        if not breaker.can_attempt():
+            breaker.total_rejected += 1
+            raise CircuitOpenError(f"{breaker.name} is unavailable, circuit open")
+    for breaker in breakers:
+        breaker.allow()
+
+
+def record_outcome(breakers: list, success: bool):
+    for breaker in breakers:
+        if success:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+
+def retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry."""
+    return random.uniform(0, min(settings.RETRY_MAX_DELAY, settings.RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def get_breaker_states() -> list:
+    return [breaker.snapshot() for breaker in list(_breakers.values())]
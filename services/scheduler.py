@@ -0,0 +1,197 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from config import settings
+from database.mongo import get_collection
+from services.graph_quota import QuotaExceededError, publish_delay
+from services.publisher import get_platform_credentials, publish_image
+from services.posts import record_post
+from services.tenant_cache import get_cached_tenant
+from services.video_jobs import enqueue_video_job
+
+scheduled_posts_collection = get_collection("scheduled_posts")
+
+# A scheduled post stays "queued" until it is done. due_at starts as the
+# requested publish time; claiming a batch moves it forward by the lease, and
+# a failed attempt moves it forward by the retry backoff. The worker only ever
+# reads the front of the (status, due_at) index, so the number of pending
+# posts does not affect the cost of a tick.
+SCHEDULE_QUEUED = "queued"
+SCHEDULE_COMPLETED = "completed"
+SCHEDULE_FAILED = "failed"
+SCHEDULE_CANCELLED = "cancelled"
+
+CANCEL_OK = "cancelled"
+CANCEL_NOT_FOUND = "not_found"
+CANCEL_IN_PROGRESS = "in_progress"
+
+
+async def schedule_post(user_obj_id: ObjectId, caption: str, publish_at: datetime,
+                        cloudinary_response: dict) -> str:
+    now = datetime.utcnow()
+    result = await scheduled_posts_collection.insert_one({
+        "user_id": user_obj_id,
+        "caption": caption,
+        "media_type": cloudinary_response.get("resource_type", "image"),
+        "media_url": cloudinary_response.get("secure_url"),
+        "cloudinary_response": cloudinary_response,
+        "publish_at": publish_at,
+        "due_at": publish_at,
+        "status": SCHEDULE_QUEUED,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+    })
+    return str(result.inserted_id)
+
+
+async def get_scheduled_post(schedule_id: ObjectId):
+    return await scheduled_posts_collection.find_one({"_id": schedule_id}, {"cloudinary_response": 0})
+
+
+async def cancel_scheduled_post(schedule_id: ObjectId) -> str:
+    """
+    Cancel a queued post unless a worker currently holds it.
+
+    A post is held while it has a claim_token and its lease (due_at) has not
+    run out; workers release the claim when they reschedule a failed attempt.
+    """
+    now = datetime.utcnow()
+    result = await scheduled_posts_collection.update_one(
+        {
+            "_id": schedule_id,
+            "status": SCHEDULE_QUEUED,
+            "$or": [{"claim_token": None}, {"due_at": {"$lte": now}}],
+        },
+        {
+            "$set": {"status": SCHEDULE_CANCELLED, "updated_at": now},
+            "$unset": {"claim_token": ""},
+        },
+    )
+    if result.modified_count == 1:
+        return CANCEL_OK
+    pending = await scheduled_posts_collection.find_one(
+        {"_id": schedule_id, "status": SCHEDULE_QUEUED}, {"_id": 1}
+    )
+    return CANCEL_IN_PROGRESS if pending else CANCEL_NOT_FOUND
+
+
+async def _claim_due_batch():
+    """Lease up to SCHEDULER_BATCH_SIZE due posts for this worker."""
+    now = datetime.utcnow()
+    due = await scheduled_posts_collection.find(
+        {"status": SCHEDULE_QUEUED, "due_at": {"$lte": now}}, {"_id": 1}
+    ).sort("due_at", 1).limit(settings.SCHEDULER_BATCH_SIZE).to_list(length=settings.SCHEDULER_BATCH_SIZE)
+    if not due:
+        return []
+
+    ids = [doc["_id"] for doc in due]
+    claim_token = ObjectId()
+    # Re-checking the filter means posts another worker claimed in between are skipped
+    await scheduled_posts_collection.update_many(
+        {"_id": {"$in": ids}, "status": SCHEDULE_QUEUED, "due_at": {"$lte": now}},
+        {"$set": {
+            "due_at": now + timedelta(seconds=settings.SCHEDULER_LEASE_SECONDS),
+            "claim_token": claim_token,
+        }},
+    )
+    return await scheduled_posts_collection.find(
+        {"_id": {"$in": ids}, "claim_token": claim_token}
+    ).to_list(length=len(ids))
+
+
+async def _finish(item: dict, fields: dict, release: bool = False) -> bool:
+    fields["updated_at"] = datetime.utcnow()
+    update = {"$set": fields}
+    if release:
+        # Rescheduled rather than finished: let the post be cancelled again
+        update["$unset"] = {"claim_token": ""}
+    # Only the worker holding the lease may record the outcome, and never over a cancellation
+    result = await scheduled_posts_collection.update_one(
+        {"_id": item["_id"], "claim_token": item["claim_token"], "status": SCHEDULE_QUEUED},
+        update,
+    )
+    return result.matched_count == 1
+
+
+async def _publish_scheduled(item: dict):
+    tenant = await get_cached_tenant(item["user_id"])
+    if not tenant:
+        await _finish(item, {"status": SCHEDULE_FAILED, "error": "Credentials not found"})
+        return
+
+    # Hold the post back rather than spend the attempt on a throttled account
+    delay = publish_delay(get_platform_credentials(tenant))
+    if delay > settings.GRAPH_QUOTA_MAX_WAIT:
+        raise QuotaExceededError(str(item["user_id"]), delay)
+
+    if item["media_type"] == "video":
+        # Reels need container polling, which the video job queue already does.
+        # The job reuses this post's _id, so a second claim cannot queue it twice.
+        job_id = await enqueue_video_job(
+            item["user_id"], item["caption"], item["cloudinary_response"], job_id=item["_id"]
+        )
+        await _finish(item, {"status": SCHEDULE_COMPLETED, "job_id": ObjectId(job_id)})
+        return
+
+    if "publish_responses" in item:
+        # Published by an earlier claim that failed before recording the post
+        insta_response, fb_response = item["publish_responses"]
+    elif item.get("publishing_started_at"):
+        # An earlier claim died or lost its lease mid publish; the post may be live
+        await _finish(item, {
+            "status": SCHEDULE_FAILED,
+            "error": "Publishing was interrupted and may have gone out; not retried to avoid a duplicate post",
+        })
+        return
+    else:
+        if not await _finish(item, {"publishing_started_at": datetime.utcnow()}):
+            # Cancelled, or the lease passed to another worker
+            return
+        insta_response, fb_response = await publish_image(
+            get_platform_credentials(tenant), item["media_url"], item["caption"]
+        )
+        await _finish(item, {"publish_responses": [insta_response, fb_response]})
+
+    post = await record_post(
+        item["user_id"], item["caption"], item["cloudinary_response"], insta_response, fb_response,
+        post_id=item["_id"],
+    )
+    await _finish(item, {"status": SCHEDULE_COMPLETED, "post_id": ObjectId(post["_id"])})
+
+
+async def _process(item: dict, slots: asyncio.Semaphore):
+    async with slots:
+        try:
+            await _publish_scheduled(item)
+        except QuotaExceededError as e:
+            # Waiting for quota is not a failed attempt
+            print(f"Scheduled post {item['_id']} deferred: {e}")
+            await _finish(item, {"due_at": datetime.utcnow() + timedelta(seconds=e.retry_after)}, release=True)
+        except Exception as e:
+            attempts = item["attempts"] + 1
+            print(f"Scheduled post {item['_id']} failed (attempt {attempts}): {e}")
+            fields = {"attempts": attempts, "error": str(e)}
+            if attempts >= settings.SCHEDULER_MAX_ATTEMPTS:
+                fields["status"] = SCHEDULE_FAILED
+                await _finish(item, fields)
+            else:
+                fields["due_at"] = datetime.utcnow() + timedelta(seconds=30 * 2 ** attempts)
+                await _finish(item, fields, release=True)
+
+
+async def run_scheduler():
+    """Publish scheduled posts as they fall due."""
+    slots = asyncio.Semaphore(settings.SCHEDULER_CONCURRENCY)
+    while True:
+        try:
+            batch = await _claim_due_batch()
+        except Exception as e:
+            print(f"Scheduler could not claim posts: {e}")
+            batch = []
+
+        if not batch:
+            await asyncio.sleep(settings.SCHEDULER_POLL_INTERVAL)
+            continue
+
+        await asyncio.gather(*(_process(item, slots) for item in batch), return_exceptions=True)
@@ -0,0 +1,100 @@
+import asyncio
+from bson import ObjectId
+from cachetools import TTLCache
+from config import settings
+from database.mongo import get_collection
+
+tenant_collection = get_collection("tenant")
+
+# Tenant documents keyed by str(user_id). Entries expire after
+# TENANT_CACHE_TTL seconds; writes in this process evict them immediately and
+# the optional change stream watcher evicts entries written by other workers.
+_cache = TTLCache(maxsize=settings.TENANT_CACHE_SIZE, ttl=settings.TENANT_CACHE_TTL)
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+# Bumped on every invalidation so a lookup that raced with a write does not
+# put the stale document it read back into the cache.
+_generation = 0
+
+
+async def get_cached_tenant(user_obj_id: ObjectId):
+    """Tenant document for a user, served from the cache when possible. Do not mutate it."""
+    key = str(user_obj_id)
+    tenant = _cache.get(key)
+    if tenant is not None:
+        _stats["hits"] += 1
+        return tenant
+
+    _stats["misses"] += 1
+    generation = _generation
+    tenant = await tenant_collection.find_one({"user_id": user_obj_id})
+    if tenant is not None and generation == _generation:
+        _cache[key] = tenant
+    return tenant
+
+
+async def get_cached_tenants(user_obj_ids: list) -> dict:
+    """Tenant documents for many users keyed by str(user_id); all misses share one $in query."""
+    tenants, missing = {}, []
+    for user_obj_id in user_obj_ids:
+        tenant = _cache.get(str(user_obj_id))
+        if tenant is not None:
+            _stats["hits"] += 1
+            tenants[str(user_obj_id)] = tenant
+        else:
+            _stats["misses"] += 1
+            missing.append(user_obj_id)
+
+    if missing:
+        generation = _generation
+        async for tenant in tenant_collection.find({"user_id": {"$in": missing}}):
+            key = str(tenant["user_id"])
+            tenants[key] = tenant
+            if generation == _generation:
+                _cache[key] = tenant
+    return tenants
+
+
+def invalidate_tenant(user_obj_id):
+    global _generation
+    _generation += 1
+    _stats["invalidations"] += 1
+    _cache.pop(str(user_obj_id), None)
+
+
+def clear_tenant_cache():
+    global _generation
+    _generation += 1
+    _stats["invalidations"] += 1
+    _cache.clear()
+
+
+def get_tenant_cache_stats():
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        "size": len(_cache),
+        "max_size": _cache.maxsize,
+        "ttl_seconds": _cache.ttl,
+        "change_stream": settings.TENANT_CACHE_CHANGE_STREAM,
+    }
+
+
+async def watch_tenant_changes():
+    """Evict cache entries for tenant documents changed by any worker."""
+    while True:
+        try:
+            async with tenant_collection.watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    full_document = change.get("fullDocument")
+                    if full_document and "user_id" in full_document:
+                        invalidate_tenant(full_document["user_id"])
+                    else:
+                        # Deletes only carry the _id, which is not our cache key
+                        clear_tenant_cache()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Tenant change stream stopped, restarting: {e}")
+            clear_tenant_cache()
+            await asyncio.sleep(5)
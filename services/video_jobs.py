@@ -0,0 +1,253 @@
+import asyncio
+from datetime import datetime, timedelta
+import httpx
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import settings
+from database.mongo import get_collection
+from services.graph_quota import QuotaExceededError
+from services.resilience import CircuitOpenError
+from services.tenant_cache import get_cached_tenant
+from services.posts import record_post
+from services.publisher import (
+    get_platform_credentials,
+    create_instagram_reel_container,
+    get_instagram_container_status,
+    publish_instagram_container,
+    publish_facebook_video,
+)
+
+video_jobs_collection = get_collection("video_jobs")
+
+# Job lifecycle: "queued" -> "completed" | "failed".
+# A queued job is picked up once next_run_at has passed. Claiming a job pushes
+# next_run_at forward by the lease, so a job held by a worker that dies is
+# picked up again after the lease runs out. Waiting for Instagram to finish
+# processing a reel is just another reschedule, so no worker sleeps on a job.
+JOB_QUEUED = "queued"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# A publish call is marked on the job (facebook_publishing_at /
+# instagram_publishing_at) before it is sent. If the job is claimed again with
+# the mark set but no response stored, the worker died or lost its lease mid
+# call, and the post may already be live, so it is not sent a second time.
+# Errors raised before anything reached Graph clear the mark again.
+NOT_SENT_ERRORS = (
+    QuotaExceededError, CircuitOpenError, httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout,
+)
+
+
+async def enqueue_video_job(user_obj_id: ObjectId, caption: str, cloudinary_response: dict,
+                            job_id: ObjectId = None) -> str:
+    """Queue a video for publishing. Enqueueing twice with the same job_id queues it once."""
+    now = datetime.utcnow()
+    job = {
+        "user_id": user_obj_id,
+        "caption": caption,
+        "video_url": cloudinary_response.get("secure_url"),
+        "cloudinary_response": cloudinary_response,
+        "status": JOB_QUEUED,
+        "progress": "Queued for publishing",
+        "ig_creation_id": None,
+        "ig_status_checks": 0,
+        "instagram_response": None,
+        "facebook_response": None,
+        "facebook_publishing_at": None,
+        "instagram_publishing_at": None,
+        "attempts": 0,
+        "next_run_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if job_id is not None:
+        job["_id"] = job_id
+    try:
+        result = await video_jobs_collection.insert_one(job)
+    except DuplicateKeyError:
+        return str(job_id)
+    return str(result.inserted_id)
+
+
+async def get_video_job(job_id: ObjectId):
+    return await video_jobs_collection.find_one(
+        {"_id": job_id},
+        {"cloudinary_response": 0},
+    )
+
+
+async def _claim_next_job():
+    now = datetime.utcnow()
+    return await video_jobs_collection.find_one_and_update(
+        {"status": JOB_QUEUED, "next_run_at": {"$lte": now}},
+        {"$set": {"next_run_at": now + timedelta(seconds=settings.VIDEO_JOB_LEASE_SECONDS)}},
+        sort=[("next_run_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _update_job(job_id: ObjectId, fields: dict):
+    fields["updated_at"] = datetime.utcnow()
+    await video_jobs_collection.update_one({"_id": job_id}, {"$set": fields})
+
+
+async def _reschedule(job_id: ObjectId, seconds: int, fields: dict):
+    fields["next_run_at"] = datetime.utcnow() + timedelta(seconds=seconds)
+    await _update_job(job_id, fields)
+
+
+async def _guarded_publish(job: dict, marker: str, publish):
+    await _update_job(job["_id"], {marker: datetime.utcnow()})
+    try:
+        return await publish()
+    except NOT_SENT_ERRORS:
+        await _update_job(job["_id"], {marker: None})
+        raise
+
+
+async def _advance_job(job: dict):
+    """Run the next step(s) of a job. Every step's result is persisted before moving on."""
+    tenant = await get_cached_tenant(job["user_id"])
+    if not tenant:
+        await _update_job(job["_id"], {
+            "status": JOB_FAILED,
+            "progress": "Failed",
+            "error": "Credentials not found",
+        })
+        return
+
+    creds = get_platform_credentials(tenant)
+    has_instagram = creds["IG_USER_ID"] and creds["ACCESS_TOKENS"]
+    has_facebook = creds["PAGE_ID"] and creds["FACEBOOK_ACCESS"]
+
+    # Facebook takes the video URL directly, so it goes out on the first run
+    if has_facebook and job["facebook_response"] is None:
+        if job.get("facebook_publishing_at"):
+            job["facebook_response"] = {
+                "error": "Facebook publish was interrupted and may have gone out; not retried to avoid a duplicate post"
+            }
+        else:
+            job["facebook_response"] = await _guarded_publish(
+                job, "facebook_publishing_at",
+                lambda: publish_facebook_video(
+                    creds["PAGE_ID"], creds["FACEBOOK_ACCESS"], job["video_url"], job["caption"]
+                ),
+            )
+        await _update_job(job["_id"], {
+            "facebook_response": job["facebook_response"],
+            "progress": "Posted to Facebook",
+        })
+
+    if has_instagram and job["instagram_response"] is None:
+        if not job["ig_creation_id"]:
+            container_res = await create_instagram_reel_container(
+                creds["IG_USER_ID"], creds["ACCESS_TOKENS"], job["video_url"], job["caption"]
+            )
+            print("Container response:", container_res)
+            if "id" not in container_res:
+                job["instagram_response"] = container_res
+                await _update_job(job["_id"], {"instagram_response": container_res})
+            else:
+                await _reschedule(job["_id"], settings.VIDEO_JOB_POLL_INTERVAL, {
+                    "ig_creation_id": container_res["id"],
+                    "progress": "Waiting for Instagram to process the video",
+                })
+                return
+        else:
+            status = await get_instagram_container_status(
+                creds["IG_USER_ID"], job["ig_creation_id"], creds["ACCESS_TOKENS"]
+            )
+            checks = job["ig_status_checks"] + 1
+            if status == "PUBLISHED":
+                # An earlier run published the container but never stored the response
+                job["instagram_response"] = {
+                    "id": None,
+                    "creation_id": job["ig_creation_id"],
+                    "note": "Published by an interrupted earlier attempt; media id unknown",
+                }
+            elif status == "FINISHED":
+                # A container can only be published once, so this is safe even after an interruption
+                job["instagram_response"] = await _guarded_publish(
+                    job, "instagram_publishing_at",
+                    lambda: publish_instagram_container(
+                        creds["IG_USER_ID"], creds["ACCESS_TOKENS"], job["ig_creation_id"]
+                    ),
+                )
+            elif status == "ERROR":
+                job["instagram_response"] = {"error": "Instagram video failed processing"}
+            elif checks >= settings.VIDEO_JOB_MAX_STATUS_CHECKS:
+                job["instagram_response"] = {"error": "Instagram video still processing, try again later."}
+            else:
+                await _reschedule(job["_id"], settings.VIDEO_JOB_POLL_INTERVAL, {
+                    "ig_status_checks": checks,
+                    "progress": f"Waiting for Instagram to process the video ({checks}/{settings.VIDEO_JOB_MAX_STATUS_CHECKS})",
+                })
+                return
+            await _update_job(job["_id"], {
+                "ig_status_checks": checks,
+                "instagram_response": job["instagram_response"],
+            })
+
+    post = await record_post(
+        job["user_id"],
+        job["caption"],
+        job["cloudinary_response"],
+        job["instagram_response"],
+        job["facebook_response"],
+        post_id=job["_id"],
+    )
+
+    await _update_job(job["_id"], {
+        "status": JOB_COMPLETED,
+        "progress": "Completed",
+        "post_id": ObjectId(post["_id"]),
+    })
+
+
+async def _run_job(job: dict, slots: asyncio.Semaphore):
+    try:
+        await _advance_job(job)
+    except QuotaExceededError as e:
+        # Waiting for quota is not a failed attempt
+        print(f"Video job {job['_id']} deferred: {e}")
+        await _reschedule(job["_id"], e.retry_after, {"progress": "Waiting for Graph API quota"})
+    except Exception as e:
+        attempts = job["attempts"] + 1
+        print(f"Video job {job['_id']} failed (attempt {attempts}): {e}")
+        if attempts >= settings.VIDEO_JOB_MAX_ATTEMPTS:
+            await _update_job(job["_id"], {
+                "status": JOB_FAILED,
+                "progress": "Failed",
+                "attempts": attempts,
+                "error": str(e),
+            })
+        else:
+            await _reschedule(job["_id"], settings.VIDEO_JOB_POLL_INTERVAL * 2 ** attempts, {
+                "attempts": attempts,
+                "error": str(e),
+            })
+    finally:
+        slots.release()
+
+
+async def run_video_job_worker():
+    """Claim due jobs and advance them, at most VIDEO_JOB_CONCURRENCY at a time."""
+    slots = asyncio.Semaphore(settings.VIDEO_JOB_CONCURRENCY)
+    running = set()
+    while True:
+        await slots.acquire()
+        try:
+            job = await _claim_next_job()
+        except Exception as e:
+            print(f"Video job worker could not claim a job: {e}")
+            job = None
+
+        if job is None:
+            slots.release()
+            await asyncio.sleep(settings.VIDEO_JOB_IDLE_SLEEP)
+            continue
+
+        task = asyncio.create_task(_run_job(job, slots))
+        running.add(task)
+        task.add_done_callback(running.discard)
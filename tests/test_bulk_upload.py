@@ -0,0 +1,39 @@
+import asyncio
+from bson import ObjectId
+import apis.social_media as social_media
+from schemas import BulkSocialMediaRequest
+
+
+def test_bulk_upload_reports_mixed_case_ids_once(monkeypatch):
+    user_obj_id = ObjectId()
+    tenant = {"insta_credentials": {"IG_USER_ID": "ig", "ACCESS_TOKENS": "token"}}
+    published = []
+
+    async def fake_get_cached_tenants(user_obj_ids):
+        return {str(oid): tenant for oid in user_obj_ids}
+
+    async def fake_store_media(data, digest=None):
+        return {"secure_url": "https://example.com/image.jpg", "resource_type": "image"}
+
+    async def fake_publish_image(creds, image_url, caption):
+        published.append(creds["IG_USER_ID"])
+        return {"id": "1"}, None
+
+    async def fake_record_post(user_obj_id, caption, result, insta_response, fb_response):
+        return {"_id": str(ObjectId()), "status": "published"}
+
+    monkeypatch.setattr(social_media, "get_cached_tenants", fake_get_cached_tenants)
+    monkeypatch.setattr(social_media, "store_media", fake_store_media)
+    monkeypatch.setattr(social_media, "publish_image", fake_publish_image)
+    monkeypatch.setattr(social_media, "record_post", fake_record_post)
+
+    payload = BulkSocialMediaRequest(
+        user_ids=[str(user_obj_id).upper(), str(user_obj_id), "not-an-id"],
+        caption="caption",
+        base64_image="aGVsbG8=",
+    )
+    response = asyncio.run(social_media.bulk_upload_image(payload, idempotency_key=None))
+
+    assert published == ["ig"]
+    assert [entry["user_id"] for entry in response["results"]] == [str(user_obj_id), "not-an-id"]
+    assert response["summary"] == {"published": 1, "failed": 1}
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import pytest
+import rsa
+from google.auth import crypt, jwt
+from config import settings
+from services.google_auth import GoogleTokenVerifier
+
+AUDIENCE = "client-id.apps.googleusercontent.com"
+
+
+def _key_pair():
+    public_key, private_key = rsa.newkeys(1024)
+    return public_key.save_pkcs1().decode(), private_key.save_pkcs1()
+
+
+def _token(private_key, key_id, **claims):
+    now = int(time.time())
+    payload = {"iss": "https://accounts.google.com", "aud": AUDIENCE, "iat": now, "exp": now + 300,
+               "email": "user@example.com"}
+    payload.update(claims)
+    return jwt.encode(crypt.RSASigner.from_string(private_key, key_id=key_id), payload).decode()
+
+
+class StubCerts:
+    """Local stand-in for Google's certs endpoint that counts fetches."""
+
+    def __init__(self, certs):
+        self.certs = certs
+        self.fetches = 0
+
+    async def __call__(self):
+        self.fetches += 1
+        return dict(self.certs), 3600
+
+
+def _verify(verifier, token):
+    return asyncio.run(verifier.verify(token))
+
+
+def test_verify_checks_signature_issuer_audience_and_expiry():
+    public_key, private_key = _key_pair()
+    verifier = GoogleTokenVerifier(AUDIENCE, fetch_certs=StubCerts({"k1": public_key}))
+
+    assert _verify(verifier, _token(private_key, "k1"))["email"] == "user@example.com"
+
+    now = int(time.time())
+    bad_tokens = [
+        _token(private_key, "k1", iss="https://evil.example.com"),
+        _token(private_key, "k1", aud="someone-else"),
+        _token(private_key, "k1", iat=now - 3600, exp=now - 600),
+        _token(_key_pair()[1], "k1"),
+    ]
+    for token in bad_tokens:
+        with pytest.raises(ValueError):
+            _verify(verifier, token)
+
+
+def test_unknown_key_id_refreshes_certs_at_most_once_per_interval(monkeypatch):
+    monkeypatch.setattr(settings, "GOOGLE_CERTS_MIN_REFRESH_INTERVAL", 60)
+    old_public, old_private = _key_pair()
+    new_public, new_private = _key_pair()
+    stub = StubCerts({"k1": old_public})
+    verifier = GoogleTokenVerifier(AUDIENCE, fetch_certs=stub)
+
+    _verify(verifier, _token(old_private, "k1"))
+    assert stub.fetches == 1
+
+    # Google rotated its keys, but the certs were fetched moments ago
+    stub.certs["k2"] = new_public
+    rotated = _token(new_private, "k2")
+    with pytest.raises(ValueError):
+        _verify(verifier, rotated)
+    assert stub.fetches == 1
+
+    # Once the interval has passed, the unknown key id forces one refresh
+    verifier._fetched_at -= 61
+    assert _verify(verifier, rotated)["email"] == "user@example.com"
+    assert stub.fetches == 2
+
+    # Tokens with made-up key ids cannot make every request fetch the certs
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            _verify(verifier, _token(new_private, "forged"))
+    assert stub.fetches == 2
@@ -1,10 +1,16 @@
 from os import getenv
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from dotenv import load_dotenv
 # from auth import ALGORITHM, SECRET_KEY
+import asyncio
 import os
+import time
+from config import settings
+from services.metrics import PASSWORD_HASH_LATENCY, PASSWORD_HASH_REJECTED
 
 # Load the .env file
 load_dotenv()
@@ -26,6 +32,60 @@ def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# bcrypt is deliberately slow, so async handlers must never call the functions
+# above directly. The pool below keeps the event loop free and caps how many
+# hash jobs may be waiting at once so a login burst is shed instead of queued.
+_hash_executor = None
+_hash_pending = 0
+
+
+def _get_hash_executor():
+    global _hash_executor
+    if _hash_executor is None:
+        if settings.PASSWORD_HASH_POOL == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+        else:
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+            )
+    return _hash_executor
+
+
+async def _run_in_hash_pool(operation: str, func, *args):
+    global _hash_pending
+    if _hash_pending >= settings.PASSWORD_HASH_MAX_QUEUE:
+        PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again shortly",
+        )
+
+    _hash_pending += 1
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_executor(), func, *args)
+    finally:
+        _hash_pending -= 1
+        # Includes the queue wait, which is what a login actually experiences
+        PASSWORD_HASH_LATENCY.labels(operation=operation).observe(time.perf_counter() - start)
+
+
+async def hash_password_async(password: str):
+    return await _run_in_hash_pool("hash", hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await _run_in_hash_pool("verify", verify_password, plain_password, hashed_password)
+
+
+def shutdown_password_hasher():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False)
+        _hash_executor = None
+
+
 def create_reset_token(email: str, RESET_TOKEN_EXPIRE_MINUTES=30):
     expire = datetime.utcnow() + timedelta(minutes=RESET_TOKEN_EXPIRE_MINUTES)
     to_encode = {"sub": email, "exp": expire}